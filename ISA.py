@@ -0,0 +1,180 @@
+"""
+The instruction set shared by the assembler and the simulator.
+
+INSTRUCTIONS and FORMATS are the only hand-written description of the ISA.
+The lookup tables the tools use are derived from them:
+  format_instructions  format -> {mnemonic: (opcode, funct3, funct7)}, for the assembler
+  opcode_format        opcode -> format, for the decoder
+  dispatch_keys        (opcode, funct3, funct7) -> mnemonic, the simulator's dispatch index
+
+The assembler and the simulator are run as stand-alone files, so they do not
+import this module. Instead, the tables and helpers each one needs are
+written into a marked section of its source:
+
+    python3 ISA.py           regenerates those sections after a change here
+    python3 ISA.py --check   exits with status 1 if any of them is out of date
+"""
+import inspect
+import os
+import sys
+
+# mnemonic -> (format, opcode, funct3, funct7); None where the format has no such field
+INSTRUCTIONS = {
+    "add": ("R", 0b0110011, 0b000, 0b0000000),
+    "sub": ("R", 0b0110011, 0b000, 0b0100000),
+    "slt": ("R", 0b0110011, 0b010, 0b0000000),
+    "srl": ("R", 0b0110011, 0b101, 0b0000000),
+    "or": ("R", 0b0110011, 0b110, 0b0000000),
+    "and": ("R", 0b0110011, 0b111, 0b0000000),
+    "lw": ("I", 0b0000011, 0b010, None),
+    "addi": ("I", 0b0010011, 0b000, None),
+    "jalr": ("I", 0b1100111, 0b000, None),
+    "sw": ("S", 0b0100011, 0b010, None),
+    "beq": ("B", 0b1100011, 0b000, None),
+    "bne": ("B", 0b1100011, 0b001, None),
+    "blt": ("B", 0b1100011, 0b100, None),
+    "jal": ("J", 0b1101111, None, None),
+}
+
+# Bit layout of each instruction format.
+# "fields" are (name, lowest bit, width) of the plain fields.
+# "imm" is the immediate as (high bit, low bit, lowest instruction bit) slices,
+# sign extended from "imm_bits" bits. Every format has the one standard
+# RV32I layout, which the assembler writes and the simulator reads.
+FORMATS = {
+    "R": {
+        "fields": (("opcode", 0, 7), ("rd", 7, 5), ("funct3", 12, 3), ("rs1", 15, 5), ("rs2", 20, 5), ("funct7", 25, 7)),
+        "imm": (),
+        "imm_bits": 0,
+    },
+    "I": {
+        "fields": (("opcode", 0, 7), ("rd", 7, 5), ("funct3", 12, 3), ("rs1", 15, 5)),
+        "imm": ((11, 0, 20),),
+        "imm_bits": 12,
+    },
+    "S": {
+        "fields": (("opcode", 0, 7), ("funct3", 12, 3), ("rs1", 15, 5), ("rs2", 20, 5)),
+        "imm": ((4, 0, 7), (11, 5, 25)),
+        "imm_bits": 12,
+    },
+    "B": {
+        "fields": (("opcode", 0, 7), ("funct3", 12, 3), ("rs1", 15, 5), ("rs2", 20, 5)),
+        "imm": ((11, 11, 7), (4, 1, 8), (10, 5, 25), (12, 12, 31)),
+        "imm_bits": 13,
+    },
+    "J": {
+        "fields": (("opcode", 0, 7), ("rd", 7, 5)),
+        "imm": ((19, 12, 12), (11, 11, 20), (10, 1, 21), (20, 20, 31)),
+        "imm_bits": 21,
+    },
+}
+
+
+def encode_fields(fmt, imm=0, **fields):
+    """
+    Builds a 32-bit instruction word from its fields.
+    A negative immediate is stored as two's complement.
+    """
+    layout = FORMATS[fmt]
+    word = 0
+    for name, shift, width in layout["fields"]:
+        word |= (fields[name] & ((1 << width) - 1)) << shift
+    for high, low, shift in layout["imm"]:
+        word |= ((imm >> low) & ((1 << (high - low + 1)) - 1)) << shift
+    return word
+
+
+def decode_immediate(fmt, word):
+    """Returns the sign-extended immediate of a word in format fmt."""
+    layout = FORMATS[fmt]
+    imm = 0
+    for high, low, shift in layout["imm"]:
+        imm |= ((word >> shift) & ((1 << (high - low + 1)) - 1)) << low
+    bits = layout["imm_bits"]
+    if bits and imm >> (bits - 1):
+        imm -= 1 << bits
+    return imm
+
+
+def dispatch_key(fmt, opcode, funct3, funct7):
+    # formats without a funct field leave it out of the key
+    has_funct3, has_funct7 = key_fields[fmt]
+    return (opcode, funct3 if has_funct3 else None, funct7 if has_funct7 else None)
+
+
+# format -> (has funct3, has funct7)
+key_fields = {
+    fmt: tuple(name in [field[0] for field in layout["fields"]] for name in ("funct3", "funct7"))
+    for fmt, layout in FORMATS.items()
+}
+format_instructions = {fmt: {} for fmt in FORMATS}
+opcode_format = {}
+dispatch_keys = {}
+for mnemonic, (fmt, opcode, funct3, funct7) in INSTRUCTIONS.items():
+    format_instructions[fmt][mnemonic] = (opcode, funct3, funct7)
+    opcode_format[opcode] = fmt
+    dispatch_keys[dispatch_key(fmt, opcode, funct3, funct7)] = mnemonic
+
+
+# Generated sections: tool source (relative to this file) -> names written into it.
+# Tables are written as literals, functions as their source.
+GENERATED = {
+    os.path.join("SimpleAssembler", "simpleassembler.py"): ("FORMATS", "format_instructions", "encode_fields"),
+    "Simulator.py": ("FORMATS", "key_fields", "opcode_format", "dispatch_keys", "decode_immediate", "dispatch_key"),
+}
+GENERATED_BEGIN = "# ---- generated from ISA.py by `python3 ISA.py`; do not edit by hand ----\n"
+GENERATED_END = "# ---- end of generated ISA section ----\n"
+
+
+def literal(value, indent=""):
+    # a table as source, one dict entry per line
+    if isinstance(value, dict) and value:
+        inner = indent + "    "
+        entries = "".join(f"{inner}{key!r}: {literal(item, inner)},\n" for key, item in value.items())
+        return "{\n" + entries + indent + "}"
+    return repr(value)
+
+
+def generated_section(names):
+    """Returns the source of the generated section holding names."""
+    parts = []
+    for name in names:
+        value = globals()[name]
+        if inspect.isfunction(value):
+            parts.append(inspect.getsource(value))
+        else:
+            parts.append(name + " = " + literal(value) + "\n")
+    return GENERATED_BEGIN + "\n".join(parts) + GENERATED_END
+
+
+def update_tool(path, names, check=False):
+    """
+    Replaces the generated section of the tool at path.
+    Returns True if it was (check: would be) changed.
+    """
+    with open(path, 'r') as f:
+        source = f.read()
+    start = source.index(GENERATED_BEGIN)
+    end = source.index(GENERATED_END, start) + len(GENERATED_END)
+    updated = source[:start] + generated_section(names) + source[end:]
+    if updated == source:
+        return False
+    if not check:
+        with open(path, 'w') as f:
+            f.write(updated)
+    return True
+
+
+def main():
+    check = "--check" in sys.argv[1:]
+    root = os.path.dirname(os.path.abspath(__file__))
+    stale = [path for path, names in GENERATED.items()
+             if update_tool(os.path.join(root, path), names, check)]
+    for path in stale:
+        print(("out of date: " if check else "updated: ") + path)
+    if check and stale:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
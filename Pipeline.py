@@ -0,0 +1,95 @@
+# Assembles a source file and simulates it in one process, without the
+# intermediate machine-code file or a second interpreter start.
+#
+#   python3 Pipeline.py <source.s> --trace <output_trace.txt> [--blocks]
+#   python3 Pipeline.py <source.s> --compare <expected_trace.txt> [--blocks]
+#     (lines compared like the grader does; <expected_trace>_r.txt too if present)
+#   python3 Pipeline.py <source.s> --hash [--blocks]
+#
+# The result is the same as running SimpleAssembler/simpleassembler.py and
+# then Simulator.py on its output.
+import os
+import sys
+import importlib.util
+from array import array
+from Simulator import Machine, TraceComparator, TraceHasher, open_trace
+
+ASSEMBLER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SimpleAssembler", "simpleassembler.py")
+
+# the assembler module, loaded on first use and shared by every assemble() call
+assembler_module = None
+
+def load_assembler():
+    global assembler_module
+    if assembler_module is None:
+        spec = importlib.util.spec_from_file_location("simpleassembler", ASSEMBLER)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        assembler_module = module
+    return assembler_module
+
+def assemble(source):
+    """Assembles source into an array of instruction words; raises ValueError on errors."""
+    with open(source, 'r') as f:
+        lines = f.readlines()
+    return array('I', load_assembler().assemble_lines(lines))
+
+def run_pipeline(source, consumer, translate=False):
+    """
+    Assembles source and runs it, streaming the trace and the memory dump into
+    consumer (a TraceWriter, BinaryTraceWriter, TraceHasher or TraceComparator),
+    which is closed at the end. Returns the machine.
+    """
+    return simulate(assemble(source), consumer, translate)
+
+def simulate(program, consumer, translate=False):
+    with consumer:
+        machine = Machine(consumer, translate)
+        machine.run(program)
+        consumer.write_memory(machine.memory)
+    return machine
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[2] not in ("--trace", "--compare", "--hash"):
+        print("Usage: python Pipeline.py <source.s> (--trace FILE | --compare FILE | --hash) [--blocks]")
+        sys.exit(1)
+    source, mode = sys.argv[1], sys.argv[2]
+    translate = "--blocks" in sys.argv[3:]
+
+    try:
+        program = assemble(source)
+    except ValueError as e:
+        # reported like the assembler does, and nothing is run or written
+        print(e)
+        sys.exit(1)
+
+    if mode == "--trace":
+        consumer = open_trace(sys.argv[3])
+    elif mode == "--compare":
+        if not os.path.isfile(sys.argv[3]):
+            print("Expected trace not found:", sys.argv[3])
+            sys.exit(1)
+        # the _r.txt trace is compared too when there is one
+        expected_decimal = sys.argv[3].replace(".txt", "_r.txt")
+        if expected_decimal == sys.argv[3] or not os.path.isfile(expected_decimal):
+            expected_decimal = None
+        consumer = TraceComparator(sys.argv[3], expected_decimal)
+    else:
+        consumer = TraceHasher()
+
+    simulate(program, consumer, translate)
+
+    if mode == "--compare":
+        trace_line, decimal_line = consumer.mismatches()
+        if trace_line is None and decimal_line is None:
+            print("MATCH")
+        else:
+            print("MISMATCH at line", trace_line if trace_line is not None else decimal_line,
+                  "of the trace" if trace_line is not None else "of the _r.txt trace")
+            sys.exit(1)
+    elif mode == "--hash":
+        for digest in consumer.hexdigests():
+            print(digest)
+
+if __name__ == "__main__":
+    main()
@@ -1,352 +1,534 @@
-import sys
-import re
-
-# Register mapping for RISC-V
-register_map = {
-    "zero": 0, "ra": 1, "sp": 2, "gp": 3, "tp": 4,
-    "t0": 5, "t1": 6, "t2": 7, "s0": 8, "s1": 9,
-    "a0": 10, "a1": 11, "a2": 12, "a3": 13, "a4": 14,
-    "a5": 15, "a6": 16, "a7": 17, "s2": 18, "s3": 19,
-    "s4": 20, "s5": 21, "s6": 22, "s7": 23, "s8": 24,
-    "s9": 25, "s10": 26, "s11": 27, "t3": 28, "t4": 29,
-    "t5": 30, "t6": 31
-}
-
-# Opcode, funct3, and funct7 mappings for R-type instructions
-r_type_instructions = {
-    "add": ("0110011", "000", "0000000"),
-    "sub": ("0110011", "000", "0100000"),
-    "slt": ("0110011", "010", "0000000"),
-    "srl": ("0110011", "101", "0000000"),
-    "or": ("0110011", "110", "0000000"),
-    "and": ("0110011", "111", "0000000")
-}
-
-i_type_instructions = {
-    "lw": ("0000011", "010"),
-    "addi": ("0010011", "000"),
-    "jalr": ("1100111", "000")
-}
-
-s_type_instructions = {
-    "sw": ("0100011", "010")
-}
-
-b_type_instructions = {
-    "beq": ("1100011", "000"),
-    "bne": ("1100011", "001"),
-    "blt": ("1100011", "100"),
-}
-
-
-j_type_instructions = {
-    "jal": ("1101111")
-}
-
-
-def decimal_to_12bit_twos_complement(decimal_number):
-    if decimal_number >= 0:
-        binary_number = decimal_number
-    else:
-        binary_number = (1 << 12) + decimal_number
-    return binary_number
-
-
-#only for b type instructions
-def decimal_to_13bit_twos_complement(decimal_number):
-    if decimal_number >= 0:
-        binary_number = decimal_number
-    else:
-        binary_number = (1 << 13) + decimal_number
-    return binary_number
-
-def convert_label_to_immediate(label, symbol_table, pc):
-#used to convert label to an immediate which can be used later.
-    if label not in symbol_table:
-        raise ValueError(f"Undefined label: {label}")
-    return symbol_table[label] - pc
-
-def decimal_to_21bit_twos_complement(decimal_number):
-    if decimal_number >= 0:
-        binary_number = decimal_number
-    else:
-        binary_number = (1 << 21) + decimal_number
-    return binary_number
-
-
-def encode_r_type(opcode, funct3, funct7, rd, rs1, rs2, registers):
-    """
-    Encodes an R-type instruction into a 32-bit binary string.
-    Checks for register overflow and arithmetic overflow.
-    """
-    if not (0 <= rd < 32 and 0 <= rs1 < 32 and 0 <= rs2 < 32):
-        raise ValueError("Register index out of range (0-31)")
-    
-    # Check for overflow in arithmetic and shift operations
-    if opcode == "0110011":
-        if funct3 == "000":  # ADD or SUB instruction
-            if funct7 == "0000000":  # ADD
-                result = registers[rs1] + registers[rs2]
-            elif funct7 == "0100000":  # SUB
-                result = registers[rs1] - registers[rs2]
-            else:
-                result = 0  # Default case (should not happen)
-            if result > (2**31 - 1) or result < -(2**31):
-                raise OverflowError("Arithmetic overflow detected in ADD/SUB instruction")
-        elif funct3 in ["001", "101"]:  # SLL, SRL, or SRA instruction
-            shift_amount = registers[rs2] & 0x1F  # Only lower 5 bits are used
-            if funct3 == "001":  # SLL
-                result = registers[rs1] << shift_amount
-            elif funct3 == "101":
-                if funct7 == "0000000":  # SRL
-                    result = registers[rs1] >> shift_amount
-                elif funct7 == "0100000":  # SRA (Arithmetic shift right)
-                    result = (registers[rs1] >> shift_amount) if registers[rs1] >= 0 else ((registers[rs1] + 0x100000000) >> shift_amount)
-            if result > (2**31 - 1) or result < -(2**31):
-                raise OverflowError("Shift operation overflow detected in SLL/SRL/SRA instruction")
-    
-    return f"{funct7}{rs2:05b}{rs1:05b}{funct3}{rd:05b}{opcode}"
-
-def encode_i_type(opcode, funct3, rd, rs1, immediate, registers):
-    if not (0 <= rd < 32 and 0 <= rs1 < 32):
-        raise ValueError("Register index out of range (0-31)")
-    if (opcode == "0000011"):
-        imm = decimal_to_12bit_twos_complement(immediate)
-        if (immediate > (2**11-1) or immediate < -(2**11)):
-            raise ValueError("Value of Immediate out of range")
-        return f"{imm:012b}{rs1:05b}{funct3}{rd:05b}{opcode}"
-    elif (opcode == "0010011"):
-        result = registers[rs1] + immediate #addition with immediate
-        imm = decimal_to_12bit_twos_complement(immediate)
-        if result > (2**31 - 1) or result < -(2**31) or immediate > (2**11-1) or immediate < -(2**11):
-            raise OverflowError("Arithmetic overflow detected in ADD/SUB instruction")
-        return f"{imm:012b}{rs1:05b}{funct3}{rd:05b}{opcode}"
-    elif (opcode == "1100111"):
-        #idk do something here 
-        # jalr type instruction will be done later
-        imm = decimal_to_12bit_twos_complement(immediate)
-        target_address = (registers[rs1] + immediate) & ~1
-        if target_address % 4 != 0:
-            raise ValueError("JALR target address must be word-aligned")
-        return f"{imm:012b}{rs1:05b}{funct3}{rd:05b}{opcode}"
-
-def encode_s_type(opcode, funct3, rs1, rs2, immediate, registers):
-    if not (0 <= rs1 < 32 and 0 <= rs2 < 32):
-        raise ValueError("Register index out of range (0-31)")
-    if (opcode == "0100011"):
-        imm = decimal_to_12bit_twos_complement(immediate)
-        if (immediate > (2**11-1) or immediate < -(2**11)):
-            raise ValueError("Value of Immediate out of range")
-        imm = str(f"{imm:012b}")
-        imm7 = imm[0:7]
-        imm5 = imm[7:12]
-    return f"{imm7}{rs2:05b}{rs1:05b}{funct3}{imm5}{opcode}"
-
-
-def encode_b_type(opcode, funct3, rs1, rs2, immediate, registers):
-    if not (0 <= rs1 < 32 and 0 <= rs2 < 32):
-        raise ValueError("Register index out of range (0-31)")
-
-    # Check if immediate is within the valid signed 13-bit range (-4096 to 4095)
-    if immediate > (2**12 - 1) or immediate < -(2**12):
-        raise ValueError("Immediate value out of range (-4096 to 4095)")
-
-    # Convert immediate to 13-bit two’s complement
-    imm = decimal_to_13bit_twos_complement(immediate)
-    imm_bin = f"{imm:013b}"  # Convert to a 13-bit binary string
-
-    # RISC-V B-type immediate field breakdown:
-    imm12 = imm_bin[0]      # Bit 12
-    imm10_5 = imm_bin[1:7]  # Bits 10-5
-    imm4_1 = imm_bin[7:11]  # Bits 4-1
-    imm11 = imm_bin[11]     # Bit 11
-
-    return f"{imm12}{imm10_5}{rs2:05b}{rs1:05b}{funct3}{imm4_1}{imm11}{opcode}"
-    
-
-def encode_j_type(opcode, rd, immediate, registers):
-    if not (0 <= rd < 32):
-        raise ValueError("Register index out of range (0-31)")
-
-    # Ensure immediate fits in signed 21-bit range (-1048576 to 1048575)
-    if immediate > (2**20 - 1) or immediate < -(2**20):
-        raise ValueError("Immediate value out of range (-1048576 to 1048575)")
-
-    # Convert to 21-bit two's complement
-    imm = decimal_to_21bit_twos_complement(immediate)
-    imm_bin = f"{imm:021b}"  # Convert to a 21-bit binary string
-
-    # Extract immediate parts according to J-type encoding
-    imm20 = imm_bin[0]        # Bit 20
-    imm10_1 = imm_bin[10:20]  # Bits 10-1
-    imm11 = imm_bin[9]        # Bit 11
-    imm19_12 = imm_bin[1:9]   # Bits 19-12
-
-    return f"{imm20}{imm19_12}{imm11}{imm10_1}{rd:05b}{opcode}"
-
-
-def parse_instruction(line, symbol_table, pc, registers):
-    pc+=4
-    """
-    Parses a single line of assembly code and converts it into binary.
-    """
-    tokens = re.split(r'[;,:.\s]+', line)
-    print(tokens, pc)
-    if not tokens:
-        return None  # Ignore empty lines
-    
-
-    if(tokens[0] not in r_type_instructions and tokens[0] not in i_type_instructions and tokens[0] not in j_type_instructions and tokens[0] not in b_type_instructions and tokens[0] not in s_type_instructions):
-        tokens.pop(0)
-    
-    instruction = tokens[0]
-    if instruction in r_type_instructions:
-        opcode, funct3, funct7 = r_type_instructions[instruction]
-        try:
-            rd = register_map.get(tokens[1], None)
-            rs1 = register_map.get(tokens[2], None)
-            rs2 = register_map.get(tokens[3], None)
-            
-            if rd is None or rs1 is None or rs2 is None:
-                raise ValueError("Invalid register name")
-            
-            return encode_r_type(opcode, funct3, funct7, rd, rs1, rs2, registers),pc
-        except (ValueError, IndexError):
-            raise ValueError("Invalid R-type instruction format or register index out of range")
-    elif instruction in i_type_instructions:
-        opcode, funct3 = i_type_instructions[instruction]
-        if (instruction == "addi" or instruction == "jalr"):
-            try:
-                rd = register_map.get(tokens[1], None)
-                rs1 = register_map.get(tokens[2], None)
-                immediate = int(tokens[3])
-                if rd is None or rs1 is None:
-                    raise ValueError("Invalid register name")
-                return encode_i_type(opcode, funct3, rd, rs1, immediate, registers),pc
-            except (ValueError, IndexError):
-                raise ValueError("Invalid I-type instruction format or register index out of range")
-        elif (instruction == "lw"):
-            try:
-                rd = register_map.get(tokens[1], None)
-                for i in range(len(tokens[2])):
-                    if (tokens[2][i] == "("):
-                        temp = i
-                        break
-                immediate = int(tokens[2][0:temp])
-                rs1 = register_map.get(tokens[2][temp+1:-1:], None)
-                if rd is None or rs1 is None:
-                    raise ValueError("Invalid register name")
-                return encode_i_type(opcode, funct3, rd, rs1, immediate, registers),pc
-            except (ValueError, IndexError):
-                raise ValueError("Invalid I-type instruction format or register index out of range")
-    elif instruction in s_type_instructions:
-        opcode, funct3 = s_type_instructions[instruction]
-        if (instruction == "sw"):
-            try:
-                rs2 = register_map.get(tokens[1], None)
-                for i in range(len(tokens[2])):
-                    if (tokens[2][i] == "("):
-                        temp = i
-                        break
-                immediate = int(tokens[2][0:temp])
-                rs1 = register_map.get(tokens[2][temp+1:-1:], None)
-                if rs1 is None or rs2 is None:
-                    raise ValueError("Invalid register name")
-                return encode_s_type(opcode, funct3, rs1, rs2, immediate, registers),pc
-            except (ValueError, IndexError):
-                raise ValueError("Invalid S-type instruction format or register index out of range")
-    elif instruction in b_type_instructions:
-        opcode, funct3 = b_type_instructions[instruction]
-        try:
-            rs1 = register_map.get(tokens[1], None)
-            rs2 = register_map.get(tokens[2], None)
-            if (tokens[3] in symbol_table):
-                pc = symbol_table[tokens[3]]
-                immediate = pc
-            elif (tokens[3].isnumeric() or (number.isnumeric() and tokens[3][0] == '-')):
-                immediate = int(tokens[3])
-            else:
-                raise ValueError("Invalid label name")
-            if rs1 is None or rs2 is None:
-                raise ValueError("Invalid register name")
-            return encode_b_type(opcode, funct3, rs1, rs2, immediate, registers),pc
-        except (ValueError, IndexError):
-            raise ValueError("Invalid B-type instruction format or register index out of range")
-    elif instruction in j_type_instructions:
-        opcode = j_type_instructions[instruction]
-        try:
-            rd = register_map.get(tokens[1], None)
-            number = tokens[2][1:]
-            if (tokens[2] in symbol_table):
-                pc = symbol_table[tokens[2]]
-                immediate = pc
-            elif (tokens[2].isnumeric() or (number.isnumeric() and tokens[2][0] == '-')):
-                immediate = int(tokens[2])
-            else:
-                raise ValueError("Invalid label name")
-            if rd is None:
-                raise ValueError("Invalid register name")
-            return encode_j_type(opcode, rd, immediate, registers),pc
-        except (ValueError, IndexError):
-            raise ValueError("Invalid J-type instruction format or register index out of range")
-    return None  # Placeholder
-
-
-def first_pass(lines):
-    """
-    First pass: Collect labels and their corresponding addresses.
-    """
-    symbol_table = {}
-    pc = 0
-    for line in lines:
-        tokens = re.split(r'[;,.\s]+', line)
-        if(tokens and ':' in tokens[0]):
-            for i in range(len(tokens[0])):
-                if (tokens[0][i] == ':'):
-                    break
-            label = tokens[0][:i]
-            symbol_table[label] = pc
-            pc+=4
-        else:
-            pc += 4  # Each instruction is 4 bytes
-    # print(symbol_table)
-    return symbol_table
-
-def assemble(input,output):
-
-    """
-    Reads an assembly file, converts it into binary, and writes the output.
-    """
-    with open(input, 'r') as f:
-        lines = [line.strip() for line in f.readlines()]
-    
-
-    symbol_table = first_pass(lines)
-    registers = [0] * 32  # Initialize 32 registers with 0
-    
-    binary_instructions = []
-    pc = 0
-    for line in lines:
-        try:
-            binary_instruction,pc = parse_instruction(line, symbol_table, pc, registers)
-            if binary_instruction:
-                print(binary_instruction)
-                binary_instructions.append(binary_instruction)
-        except (ValueError, OverflowError) as e:
-            print(f"Error at PC {pc}: {e}")
-            return
-    
-    with open(output, 'w') as f:
-        for binary in binary_instructions:
-            f.write(binary + '\n')
-
-
-if len(sys.argv) != 3:
-    print("Usage: python assembler.py <input_file> <output_file>")
-    sys.exit(1)
-
-input_file = sys.argv[1]  # Get input filename from command line
-output_file = sys.argv[2]  # Get output filename from command line
-
-assemble(input_file, output_file)  # Pass correct file paths'
-
+import os
+import sys
+import json
+from array import array
+import re
+import logging
+from collections import namedtuple
+
+# Diagnostics: errors are always shown, per-line details only with --verbose
+logger = logging.getLogger("assembler")
+
+# Register mapping for RISC-V
+register_map = {
+    "zero": 0, "ra": 1, "sp": 2, "gp": 3, "tp": 4,
+    "t0": 5, "t1": 6, "t2": 7, "s0": 8, "s1": 9,
+    "a0": 10, "a1": 11, "a2": 12, "a3": 13, "a4": 14,
+    "a5": 15, "a6": 16, "a7": 17, "s2": 18, "s3": 19,
+    "s4": 20, "s5": 21, "s6": 22, "s7": 23, "s8": 24,
+    "s9": 25, "s10": 26, "s11": 27, "t3": 28, "t4": 29,
+    "t5": 30, "t6": 31
+}
+
+# Instruction formats and encodings, generated from the shared spec in ISA.py
+# so this file runs on its own.
+# ---- generated from ISA.py by `python3 ISA.py`; do not edit by hand ----
+FORMATS = {
+    'R': {
+        'fields': (('opcode', 0, 7), ('rd', 7, 5), ('funct3', 12, 3), ('rs1', 15, 5), ('rs2', 20, 5), ('funct7', 25, 7)),
+        'imm': (),
+        'imm_bits': 0,
+    },
+    'I': {
+        'fields': (('opcode', 0, 7), ('rd', 7, 5), ('funct3', 12, 3), ('rs1', 15, 5)),
+        'imm': ((11, 0, 20),),
+        'imm_bits': 12,
+    },
+    'S': {
+        'fields': (('opcode', 0, 7), ('funct3', 12, 3), ('rs1', 15, 5), ('rs2', 20, 5)),
+        'imm': ((4, 0, 7), (11, 5, 25)),
+        'imm_bits': 12,
+    },
+    'B': {
+        'fields': (('opcode', 0, 7), ('funct3', 12, 3), ('rs1', 15, 5), ('rs2', 20, 5)),
+        'imm': ((11, 11, 7), (4, 1, 8), (10, 5, 25), (12, 12, 31)),
+        'imm_bits': 13,
+    },
+    'J': {
+        'fields': (('opcode', 0, 7), ('rd', 7, 5)),
+        'imm': ((19, 12, 12), (11, 11, 20), (10, 1, 21), (20, 20, 31)),
+        'imm_bits': 21,
+    },
+}
+
+format_instructions = {
+    'R': {
+        'add': (51, 0, 0),
+        'sub': (51, 0, 32),
+        'slt': (51, 2, 0),
+        'srl': (51, 5, 0),
+        'or': (51, 6, 0),
+        'and': (51, 7, 0),
+    },
+    'I': {
+        'lw': (3, 2, None),
+        'addi': (19, 0, None),
+        'jalr': (103, 0, None),
+    },
+    'S': {
+        'sw': (35, 2, None),
+    },
+    'B': {
+        'beq': (99, 0, None),
+        'bne': (99, 1, None),
+        'blt': (99, 4, None),
+    },
+    'J': {
+        'jal': (111, None, None),
+    },
+}
+
+def encode_fields(fmt, imm=0, **fields):
+    """
+    Builds a 32-bit instruction word from its fields.
+    A negative immediate is stored as two's complement.
+    """
+    layout = FORMATS[fmt]
+    word = 0
+    for name, shift, width in layout["fields"]:
+        word |= (fields[name] & ((1 << width) - 1)) << shift
+    for high, low, shift in layout["imm"]:
+        word |= ((imm >> low) & ((1 << (high - low + 1)) - 1)) << shift
+    return word
+# ---- end of generated ISA section ----
+
+# Opcode, funct3 and funct7 of every mnemonic, per format
+r_type_instructions = dict(format_instructions["R"])
+i_type_instructions = {name: fields[:2] for name, fields in format_instructions["I"].items()}
+s_type_instructions = {name: fields[:2] for name, fields in format_instructions["S"].items()}
+b_type_instructions = {name: fields[:2] for name, fields in format_instructions["B"].items()}
+j_type_instructions = {name: fields[0] for name, fields in format_instructions["J"].items()}
+
+
+def convert_label_to_immediate(label, symbol_table, pc):
+#used to convert label to an immediate which can be used later.
+    if label not in symbol_table:
+        raise ValueError(f"Undefined label: {label}")
+    return symbol_table[label] - pc
+
+
+def encode_r_type(opcode, funct3, funct7, rd, rs1, rs2, registers):
+    """
+    Encodes an R-type instruction into a 32-bit word.
+    Checks for register overflow and arithmetic overflow.
+    """
+    if not (0 <= rd < 32 and 0 <= rs1 < 32 and 0 <= rs2 < 32):
+        raise ValueError("Register index out of range (0-31)")
+    
+    # Check for overflow in arithmetic and shift operations
+    if opcode == 0b0110011:
+        if funct3 == 0b000:  # ADD or SUB instruction
+            if funct7 == 0b0000000:  # ADD
+                result = registers[rs1] + registers[rs2]
+            elif funct7 == 0b0100000:  # SUB
+                result = registers[rs1] - registers[rs2]
+            else:
+                result = 0  # Default case (should not happen)
+            if result > (2**31 - 1) or result < -(2**31):
+                raise OverflowError("Arithmetic overflow detected in ADD/SUB instruction")
+        elif funct3 in [0b001, 0b101]:  # SLL, SRL, or SRA instruction
+            shift_amount = registers[rs2] & 0x1F  # Only lower 5 bits are used
+            if funct3 == 0b001:  # SLL
+                result = registers[rs1] << shift_amount
+            elif funct3 == 0b101:
+                if funct7 == 0b0000000:  # SRL
+                    result = registers[rs1] >> shift_amount
+                elif funct7 == 0b0100000:  # SRA (Arithmetic shift right)
+                    result = (registers[rs1] >> shift_amount) if registers[rs1] >= 0 else ((registers[rs1] + 0x100000000) >> shift_amount)
+            if result > (2**31 - 1) or result < -(2**31):
+                raise OverflowError("Shift operation overflow detected in SLL/SRL/SRA instruction")
+    
+    return encode_fields("R", opcode=opcode, funct3=funct3, funct7=funct7, rd=rd, rs1=rs1, rs2=rs2)
+
+def encode_i_type(opcode, funct3, rd, rs1, immediate, registers):
+    if not (0 <= rd < 32 and 0 <= rs1 < 32):
+        raise ValueError("Register index out of range (0-31)")
+    if (opcode == 0b0000011):
+        if (immediate > (2**11-1) or immediate < -(2**11)):
+            raise ValueError("Value of Immediate out of range")
+    elif (opcode == 0b0010011):
+        result = registers[rs1] + immediate #addition with immediate
+        if result > (2**31 - 1) or result < -(2**31) or immediate > (2**11-1) or immediate < -(2**11):
+            raise OverflowError("Arithmetic overflow detected in ADD/SUB instruction")
+    elif (opcode == 0b1100111):
+        if (immediate > (2**11-1) or immediate < -(2**11)):
+            raise ValueError("Value of Immediate out of range")
+        target_address = (registers[rs1] + immediate) & ~1
+        if target_address % 4 != 0:
+            raise ValueError("JALR target address must be word-aligned")
+    return encode_fields("I", immediate, opcode=opcode, funct3=funct3, rd=rd, rs1=rs1)
+
+def encode_s_type(opcode, funct3, rs1, rs2, immediate, registers):
+    if not (0 <= rs1 < 32 and 0 <= rs2 < 32):
+        raise ValueError("Register index out of range (0-31)")
+    if (immediate > (2**11-1) or immediate < -(2**11)):
+        raise ValueError("Value of Immediate out of range")
+    return encode_fields("S", immediate, opcode=opcode, funct3=funct3, rs1=rs1, rs2=rs2)
+
+
+def encode_b_type(opcode, funct3, rs1, rs2, immediate, registers):
+    if not (0 <= rs1 < 32 and 0 <= rs2 < 32):
+        raise ValueError("Register index out of range (0-31)")
+
+    # Check if immediate is within the valid signed 13-bit range (-4096 to 4095)
+    if immediate > (2**12 - 1) or immediate < -(2**12):
+        raise ValueError("Immediate value out of range (-4096 to 4095)")
+
+    return encode_fields("B", immediate, opcode=opcode, funct3=funct3, rs1=rs1, rs2=rs2)
+    
+
+def encode_j_type(opcode, rd, immediate, registers):
+    if not (0 <= rd < 32):
+        raise ValueError("Register index out of range (0-31)")
+
+    # Ensure immediate fits in signed 21-bit range (-1048576 to 1048575)
+    if immediate > (2**20 - 1) or immediate < -(2**20):
+        raise ValueError("Immediate value out of range (-1048576 to 1048575)")
+
+    return encode_fields("J", immediate, opcode=opcode, rd=rd)
+
+
+# Token kinds produced by tokenize()
+LABEL = "label"
+MNEMONIC = "mnemonic"
+REGISTER = "register"
+IMMEDIATE = "immediate"
+MEMORY = "memory"      # imm(reg), value is (immediate, register index); either may be None
+SYMBOL = "symbol"      # any other word, e.g. a label used as a branch target
+
+Token = namedtuple("Token", ["kind", "text", "value"])
+
+mnemonics = set(r_type_instructions) | set(i_type_instructions) | set(s_type_instructions) | set(b_type_instructions) | set(j_type_instructions)
+
+# A leading "name:" is a label, everything else is split on , ; : . and whitespace
+TOKEN_PATTERN = re.compile(r'(?P<label>^[^;,.\s:]*:)|(?P<field>[^;,:.\s]+)')
+MEMORY_PATTERN = re.compile(r'([^(]*)\((.*)\)$')
+
+
+def classify(text):
+    if text in mnemonics:
+        return Token(MNEMONIC, text, text)
+    if text in register_map:
+        return Token(REGISTER, text, register_map[text])
+    match = MEMORY_PATTERN.match(text)
+    if match:
+        try:
+            immediate = int(match.group(1))
+        except ValueError:
+            immediate = None
+        return Token(MEMORY, text, (immediate, register_map.get(match.group(2))))
+    try:
+        return Token(IMMEDIATE, text, int(text))
+    except ValueError:
+        return Token(SYMBOL, text, text)
+
+
+def tokenize(line):
+    """
+    Splits one source line into typed tokens in a single scan.
+    A label, if present, is always the first token.
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(line):
+        if match.lastgroup == "label":
+            tokens.append(Token(LABEL, match.group()[:-1], match.group()[:-1]))
+        else:
+            tokens.append(classify(match.group()))
+    return tokens
+
+
+def is_offset(token):
+    # branch/jump offsets are plain decimal numbers, optionally negative
+    text = token.text
+    return text.isnumeric() or (text[:1] == '-' and text[1:].isnumeric())
+
+
+def register(tokens, i):
+    if tokens[i].kind != REGISTER:
+        raise ValueError("Invalid register name")
+    return tokens[i].value
+
+
+def memory_operand(tokens, i):
+    if tokens[i].kind != MEMORY or None in tokens[i].value:
+        raise ValueError("Invalid memory operand")
+    return tokens[i].value
+
+
+def branch_target(token, symbol_table):
+    # returns (immediate, pc); a label resolves to its address
+    if token.text in symbol_table:
+        return symbol_table[token.text], symbol_table[token.text]
+    if is_offset(token):
+        return int(token.text), None
+    raise ValueError("Invalid label name")
+
+
+def parse_instruction(tokens, symbol_table, pc, registers):
+    pc+=4
+    """
+    Converts the tokens of one line of assembly code into binary.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s %s", [token.text for token in tokens], pc)
+    if tokens and tokens[0].kind == LABEL:
+        tokens = tokens[1:]
+    if not tokens:
+        return None, pc - 4  # Ignore empty and label-only lines
+
+    if tokens[0].kind != MNEMONIC:
+        raise ValueError(f"Unknown instruction: {tokens[0].text}")
+    
+    instruction = tokens[0].text
+    if instruction in r_type_instructions:
+        opcode, funct3, funct7 = r_type_instructions[instruction]
+        try:
+            rd = register(tokens, 1)
+            rs1 = register(tokens, 2)
+            rs2 = register(tokens, 3)
+            return encode_r_type(opcode, funct3, funct7, rd, rs1, rs2, registers),pc
+        except (ValueError, IndexError):
+            raise ValueError("Invalid R-type instruction format or register index out of range")
+    elif instruction in i_type_instructions:
+        opcode, funct3 = i_type_instructions[instruction]
+        if (instruction == "addi" or instruction == "jalr"):
+            try:
+                rd = register(tokens, 1)
+                rs1 = register(tokens, 2)
+                if tokens[3].kind != IMMEDIATE:
+                    raise ValueError("Invalid immediate")
+                immediate = tokens[3].value
+                return encode_i_type(opcode, funct3, rd, rs1, immediate, registers),pc
+            except (ValueError, IndexError):
+                raise ValueError("Invalid I-type instruction format or register index out of range")
+        elif (instruction == "lw"):
+            try:
+                rd = register(tokens, 1)
+                immediate, rs1 = memory_operand(tokens, 2)
+                return encode_i_type(opcode, funct3, rd, rs1, immediate, registers),pc
+            except (ValueError, IndexError):
+                raise ValueError("Invalid I-type instruction format or register index out of range")
+    elif instruction in s_type_instructions:
+        opcode, funct3 = s_type_instructions[instruction]
+        if (instruction == "sw"):
+            try:
+                rs2 = register(tokens, 1)
+                immediate, rs1 = memory_operand(tokens, 2)
+                return encode_s_type(opcode, funct3, rs1, rs2, immediate, registers),pc
+            except (ValueError, IndexError):
+                raise ValueError("Invalid S-type instruction format or register index out of range")
+    elif instruction in b_type_instructions:
+        opcode, funct3 = b_type_instructions[instruction]
+        try:
+            rs1 = register(tokens, 1)
+            rs2 = register(tokens, 2)
+            immediate, label_pc = branch_target(tokens[3], symbol_table)
+            if label_pc is not None:
+                pc = label_pc
+            return encode_b_type(opcode, funct3, rs1, rs2, immediate, registers),pc
+        except (ValueError, IndexError):
+            raise ValueError("Invalid B-type instruction format or register index out of range")
+    elif instruction in j_type_instructions:
+        opcode = j_type_instructions[instruction]
+        try:
+            rd = register(tokens, 1)
+            immediate, label_pc = branch_target(tokens[2], symbol_table)
+            if label_pc is not None:
+                pc = label_pc
+            return encode_j_type(opcode, rd, immediate, registers),pc
+        except (ValueError, IndexError):
+            raise ValueError("Invalid J-type instruction format or register index out of range")
+
+
+def first_pass(tokenized):
+    """
+    First pass: Collect labels and their corresponding addresses.
+    """
+    symbol_table = {}
+    pc = 0
+    for tokens in tokenized:
+        if tokens and tokens[0].kind == LABEL:
+            symbol_table[tokens[0].value] = pc
+            tokens = tokens[1:]
+        if tokens:
+            pc += 4  # Each instruction is 4 bytes
+    # print(symbol_table)
+    return symbol_table
+
+def assemble_lines(lines):
+    """
+    Assembles a list of source lines and returns the encoded instructions
+    as 32-bit integers.
+    Raises ValueError naming the source line on the first error.
+    """
+    # every line is tokenized once and both passes share the tokens
+    tokenized = [tokenize(line.strip()) for line in lines]
+    symbol_table = first_pass(tokenized)
+    registers = [0] * 32  # Initialize 32 registers with 0
+    
+    binary_instructions = []
+    pc = 0
+    verbose = logger.isEnabledFor(logging.DEBUG)
+    for line_number, tokens in enumerate(tokenized, 1):
+        try:
+            binary_instruction,pc = parse_instruction(tokens, symbol_table, pc, registers)
+        except (ValueError, OverflowError) as e:
+            raise ValueError(f"Error at line {line_number} (PC {pc}): {e}") from e
+        if binary_instruction is not None:
+            if verbose:
+                logger.debug(format(binary_instruction, '032b'))
+            binary_instructions.append(binary_instruction)
+    return binary_instructions
+
+
+class IncrementalAssembler:
+    """
+    Assembles the same, slowly changing source again and again. Every line's
+    result is cached under (normalized text, PC, addresses of the labels it
+    uses), so a run only re-encodes lines whose text changed or whose label
+    targets moved. A line without labels encodes the same at any PC, so its
+    key has None for the PC and inserting a line does not re-encode the
+    lines after it; a line that uses a label keeps its PC in the key. The
+    cache can be kept in a file between runs; it only keeps the entries the
+    latest run used.
+    """
+
+    # bump when the meaning of a cache file entry changes
+    CACHE_VERSION = 2
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.entries = {}   # (text, pc or None, labels) -> (word or None, next pc - pc)
+        self.tokens = {}    # text -> tokens
+        self.reused = 0
+        self.encoded = 0
+        self.changed = False
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r') as f:
+                    data = json.load(f)
+                # caches written by an older version are dropped
+                if isinstance(data, dict) and data.get("version") == self.CACHE_VERSION:
+                    for text, pc, labels, word, step in data["entries"]:
+                        key = (text, pc, tuple(tuple(label) for label in labels))
+                        self.entries[key] = (word, step)
+            except (ValueError, TypeError, KeyError):
+                # a damaged cache only costs a full reassembly
+                self.entries = {}
+
+    def tokenize(self, text):
+        tokens = self.tokens.get(text)
+        if tokens is None:
+            tokens = self.tokens[text] = tokenize(text)
+        return tokens
+
+    def assemble_lines(self, lines):
+        """Same result and errors as assemble_lines(lines)."""
+        # runs of whitespace never change the tokens, so they do not change the key
+        texts = [" ".join(line.split()) for line in lines]
+        tokenized = [self.tokenize(text) for text in texts]
+        symbol_table = first_pass(tokenized)
+        registers = [0] * 32
+
+        binary_instructions = []
+        used = {}
+        pc = 0
+        self.reused = self.encoded = 0
+        verbose = logger.isEnabledFor(logging.DEBUG)
+        for line_number, (text, tokens) in enumerate(zip(texts, tokenized), 1):
+            # any token naming a label resolves through the symbol table
+            labels = tuple((token.text, symbol_table[token.text])
+                           for token in tokens if token.kind != LABEL and token.text in symbol_table)
+            # labels resolve to absolute addresses, so only a line using one depends on its PC
+            key = (text, pc if labels else None, labels)
+            entry = used.get(key) or self.entries.get(key)
+            if entry is None:
+                try:
+                    binary_instruction, next_pc = parse_instruction(tokens, symbol_table, pc, registers)
+                except (ValueError, OverflowError) as e:
+                    raise ValueError(f"Error at line {line_number} (PC {pc}): {e}") from e
+                entry = (binary_instruction, next_pc - pc)
+                self.encoded += 1
+            else:
+                self.reused += 1
+            used[key] = entry
+            binary_instruction, step = entry
+            pc += step
+            if binary_instruction is not None:
+                if verbose:
+                    logger.debug(format(binary_instruction, '032b'))
+                binary_instructions.append(binary_instruction)
+        self.changed = self.encoded > 0 or len(used) != len(self.entries)
+        self.entries = used
+        self.tokens = {text: self.tokens[text] for text in texts}
+        logger.debug("re-encoded %d lines, reused %d", self.encoded, self.reused)
+        return binary_instructions
+
+    def save(self):
+        # an unchanged cache is not rewritten
+        if self.cache_file is None or not self.changed:
+            return
+        entries = [[text, pc, [list(label) for label in labels], word, step]
+                   for (text, pc, labels), (word, step) in self.entries.items()]
+        temp = self.cache_file + ".tmp"
+        with open(temp, 'w') as f:
+            json.dump({"version": self.CACHE_VERSION, "entries": entries}, f)
+        os.replace(temp, self.cache_file)
+
+
+def assemble_file(input, output, assembler=None):
+    """
+    Reads an assembly file, converts it into binary, and writes the output.
+    An output name ending in .bin gets raw 32-bit little-endian words,
+    anything else one line of 32 binary digits per instruction.
+    With an IncrementalAssembler only the changed lines are re-encoded.
+    Nothing is written if the source has an error.
+    """
+    with open(input, 'r') as f:
+        lines = f.readlines()
+    try:
+        if assembler is None:
+            binary_instructions = assemble_lines(lines)
+        else:
+            binary_instructions = assembler.assemble_lines(lines)
+            assembler.save()
+    except ValueError as e:
+        logger.error(str(e))
+        return False
+    
+    if output.endswith(".bin"):
+        words = array('I', binary_instructions)
+        if sys.byteorder == "big":
+            words.byteswap()
+        with open(output, 'wb') as f:
+            words.tofile(f)
+        return True
+
+    # text formatting happens only here, at output time
+    with open(output, 'w') as f:
+        f.write("".join(format(binary, '032b') + '\n' for binary in binary_instructions))
+    return True
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg not in ("--verbose", "--incremental")]
+    if len(args) != 2:
+        print("Usage: python assembler.py [--verbose] [--incremental] <input_file> <output_file>")
+        sys.exit(1)
+
+    logging.basicConfig(stream=sys.stdout, format="%(message)s",
+                        level=logging.DEBUG if "--verbose" in sys.argv[1:] else logging.INFO)
+
+    input_file = args[0]  # Get input filename from command line
+    output_file = args[1]  # Get output filename from command line
+
+    # --incremental keeps the per-line cache next to the output file
+    assembler = None
+    if "--incremental" in sys.argv[1:]:
+        assembler = IncrementalAssembler(output_file + ".cache")
+
+    assemble_file(input_file, output_file, assembler)  # Pass correct file paths
+
+
+if __name__ == "__main__":
+    main()
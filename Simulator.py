@@ -1,287 +1,1218 @@
-import sys
-registers = [0,0,380,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0] #for stack pointer
-PC = 0
-Memory_address = {}
-overflow = pow(2,32)
-
-temp_memory_address = {}
-
-opcode_instruction = {
-    "0110011" : "R_Type",
-    "0000011" : "I_Type",
-    "0010011" : "I_Type",
-    "1100111" : "I_Type",
-    "0100011" : "S_Type",
-    "1100011" : "B_Type",
-    "1101111" : "J_Type"
-}
-def decimal_to_32bit(num):
-    if num < 0:
-        num = (1 << 32) + num  # Convert negative numbers to two's complement
-    
-    binary_rep = format(num %overflow, '#034b')  # Ensure 32-bit output with '0b' prefix
-    return binary_rep
-
-def to_signed(x):
-    if x >= 2**31:
-        return x - 2**32
-    return x
-
-def sign_extend(bin_str, bits):
-    value = int(bin_str, 2)
-    if bin_str[0] == '1':  # negative number
-        value -= (1 << len(bin_str))
-    return value
-
-
-
-def init_memory_address(Memory_address):
-    i = 65536
-    while i <= 65660:
-        hex_string = format(i, '08X')
-        Memory_address[f"0x{hex_string}"] = 0
-        i+=4
-    # for i in Memory_address:
-    #     print(i, Memory_address[i])
-
-
-
-def type_of_instruction(line, Memory_address, registers):
-    trace_array = []
-    new_trace_array=  []
-    global PC
-    halt = 0
-    opcode = line[25:32]
-    # print(opcode)
-    if opcode in opcode_instruction:
-        if opcode_instruction[opcode] == "R_Type":
-            # PC+=4
-            # print(PC, registers)
-            PC = simulate_R_type(line, registers, Memory_address)
-            # print(PC, registers)
-            # print(new_PC)
-            # PC = new_PC
-        elif opcode_instruction[opcode] == "I_Type":
-            PC = simulate_I_type(line, registers, Memory_address)
-        elif opcode_instruction[opcode] == "S_Type":
-            PC = simulate_S_type(line, registers, Memory_address)
-        elif opcode_instruction[opcode] == "B_Type":
-            PC, halt = simulate_B_type(line, registers, Memory_address)
-        elif opcode_instruction[opcode] == "J_Type":
-            PC = simulate_J_type(line, registers, Memory_address)
-    else:
-        raise Exception("Unsupported type of instruction")
-    # print(line, end = " ")
-    if (halt):
-        trace_array.append(decimal_to_32bit(PC-4))
-        new_trace_array.append(PC-4)
-        # print(decimal_to_32bit(PC-4), end = " ")
-        for i in registers:
-            trace_array.append(decimal_to_32bit(i))
-            new_trace_array.append(i)
-            # print(decimal_to_32bit(i), end = " ")
-        # print("")
-        return new_trace_array, trace_array, True
-    trace_array.append(decimal_to_32bit(PC))
-    new_trace_array.append(PC)
-    # print(decimal_to_32bit(PC), end = " ")
-    for i in registers:
-        trace_array.append(decimal_to_32bit(i))
-        new_trace_array.append(i)
-        # print(decimal_to_32bit(i), end = " ")
-    # print("")
-    return new_trace_array, trace_array, False
-
-def simulate_R_type(line, registers, Memory_address):
-    global PC
-    func3 = line[17:20]
-    func7 = line[0:7]
-    rs2 = int(line[7:12], 2)
-    rs1   = int(line[12:17], 2)
-    rd    = int(line[20:25], 2)
-    if (func3 == "000" and func7 == "0000000" and rd != 0):
-        # print("add")
-        registers[rd] = (registers[rs1] + registers[rs2])%overflow
-    elif (func3 == "000" and func7 == "0100000" and rd != 0):
-        # print("sub")
-        registers[rd] = (registers[rs1] - registers[rs2])%overflow
-    elif (func3 == "010" and rd != 0):
-        # print("slt")
-        if (to_signed(registers[rs1]) < to_signed(registers[rs2])):
-            registers[rd] = 1
-        else:
-            registers[rd] = 0
-    elif (func3 == "101" and rd != 0):
-        # print("srl")
-        temp = registers[rs2] % 16
-        registers[rd] = (registers[rs1] >> temp) %overflow
-    elif (func3 == "110" and rd != 0):
-        # print("or")
-        registers[rd] = registers[rs1] | registers[rs2]
-    elif (func3 == "111" and rd != 0):
-        # print("and")
-        registers[rd] = registers[rs1] & registers[rs2]
-    else:
-        raise Exception("Unsupported R-type instruction")
-    # print(line, rd, rs1, rs2)
-    # print(PC+4)
-    return PC + 4
-
-def simulate_I_type(line, registers, Memory_address):
-    imm_temp = line[0:12]
-    imm = sign_extend(imm_temp, 12)
-    rs1 = int(line[12:17], 2)
-    func3 = line[17:20]
-    rd = int(line[20:25], 2)
-    opcode = line[25:32]
-    # print(rd, rs1, imm, line)
-    if (opcode == "0000011"):
-        if (func3 == "010"):
-            add = (registers[rs1] + imm) %overflow
-            temp_str = format(add, '08X')
-            if (Memory_address.get(f"0x{temp_str}") == None):
-                if (temp_memory_address.get(add) == None):
-                    return PC+4
-                else:
-                    if (rd != 0):
-                        registers[rd] = temp_memory_address[add]
-                    return PC+4
-            else:
-                if (rd != 0):
-                    registers[rd] = Memory_address[f"0x{temp_str}"]
-                return PC+4
-        else:
-            raise Exception("Unsupported I-type (func3)")
-    elif (opcode == "0010011"):
-        if (func3 == "000"):
-            if (rd != 0):
-                registers[rd] = (registers[rs1] + imm)%overflow
-            return PC+4
-        else:
-            raise Exception("Unsupported I-type (func3)")
-    elif (opcode == "1100111"):
-        if (func3 == "000"):
-        # print(rd, rs1, imm, line)
-            if (rd != 0):
-                registers[rd] = PC+4
-            return (registers[rs1] + imm) %overflow
-        else:
-            raise Exception("Unsupported I-type")
-
-
-def simulate_S_type(line, registers, Memory_address):
-    imm_temp= line[0:7] + line[20:25]
-    imm = sign_extend(imm_temp, 12)
-    rs2 = int(line[7:12], 2)
-    rs1 = int(line[12:17], 2)
-    funct3 = line[17:20]
-    opcode = line[25:32]
-    # print(rs1, rs2, imm)
-    if (opcode == "0100011" and funct3 == "010"):
-        resulting_address = (registers[rs1] + imm) %overflow
-        temp_str = format(resulting_address, '08X')
-        if (Memory_address.get(f"0x{temp_str}") == None):
-            temp_memory_address[resulting_address] = registers[rs2]
-            return PC+4
-        else:
-            Memory_address[f"0x{temp_str}"] = registers[rs2]
-            return PC+4
-    else:
-        raise Exception("Unsupported S-type")
-    
-def simulate_B_type(line, registers, Memory_address):
-    imm_temp = line[0:1] + line[24:25] + line[1:7] + line[20:24] + '0'
-    imm = sign_extend(imm_temp, 13)
-    rs2 = int(line[7:12], 2)
-    rs1 = int(line[12:17], 2)
-    funct3 = line[17:20]
-    # print(rs1 , rs2, imm)
-    if (funct3 == "000"):
-        if (registers[rs1] == registers[rs2] and imm == 0):
-            return PC+4, True
-        elif (registers[rs1] == registers[rs2]):
-            return PC + imm, False
-        else:
-            return PC+4, False
-    elif (funct3 == "001"):
-        if (registers[rs1] != registers[rs2]):
-            return PC+imm, False
-        else:
-            return PC+4, False
-    else:
-        raise Exception("Unsupported B-type")
-    
-def simulate_J_type(line, registers, Memory_address):
-    imm_temp = line[12:20] + line[11:12] + line[1:11] + line[0:1]
-    imm = sign_extend(imm_temp, 21)
-    rd = int(line[20:25], 2)
-    if rd != 0:
-        registers[rd] = PC + 4
-    return PC + imm
-
-def load_instructions(filename):
-    with open(filename, 'r') as f:
-        lines = [line.strip() for line in f]
-    return lines
-
-def write_output(trace_array, output_file, temp):
-    if (temp == 1):
-        with open(output_file, 'w') as f:
-            for line in trace_array:
-                f.write(str(line) + " ")
-            f.write("\n")
-    else:
-        with open(output_file, 'a') as f:
-            for line in trace_array:
-                f.write(str(line) + " ")
-            f.write("\n")
-
-def main():
-    # if len(sys.argv) != 3:
-    #     print("Usage: python Simulator.py <input_binary_file> <output_trace_file>")
-    #     sys.exit(1)
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
-    #output_file = "new.txt"
-    #input_file = "file.txt"
-    output_decimal = output_file.replace(".txt", "_r.txt")
-    lines = load_instructions(input_file)
-    # registers, PC, data_memory = init_state()
-    # run_simulation(instructions, registers, PC, data_memory, output_file)
-    # lines = load_instructions("file.txt")
-    init_memory_address(Memory_address)
-
-    temp1 = 1
-
-    while PC < 4*len(lines):
-        if (PC//4 < 0):
-            raise Exception("PC out of bounds")
-        new_trace_array, trace_array, halt = type_of_instruction(lines[PC//4], Memory_address, registers)
-        write_output(trace_array, output_file, temp1)
-        write_output(new_trace_array, output_decimal, temp1)
-        temp1 = 0
-        if (halt):
-            break
-    if (halt is False):
-        raise Exception("Halt not detected")
-    # for line in lines:
-    #     # print(line)
-    #     # print(PC)
-    #     type_of_instruction(line, Memory_address, registers)
-
-    with open(output_file, 'a') as f:
-        for i in Memory_address:
-            f.write(i+":"+decimal_to_32bit(Memory_address[i]))
-            f.write("\n")
-    with open(output_decimal, 'a') as f:
-        for i in Memory_address:
-            f.write(str(i)+":"+str(Memory_address[i]))
-            f.write("\n")
-    # for i in Memory_address:
-    #     print(i, end = '')
-    #     print(':', end = '')
-    #     print(decimal_to_32bit(Memory_address[i]))
-    # print(sign_extend("1111111110000", 13))
-
-if __name__ == "__main__":
+import sys
+import os
+import mmap
+import struct
+import hashlib
+import json
+import time
+from array import array
+from collections import Counter, namedtuple
+from functools import lru_cache
+from itertools import chain
+overflow = pow(2,32)
+
+# Instruction formats, decoding and dispatch keys, generated from the shared
+# spec in ISA.py so this file runs on its own.
+# ---- generated from ISA.py by `python3 ISA.py`; do not edit by hand ----
+FORMATS = {
+    'R': {
+        'fields': (('opcode', 0, 7), ('rd', 7, 5), ('funct3', 12, 3), ('rs1', 15, 5), ('rs2', 20, 5), ('funct7', 25, 7)),
+        'imm': (),
+        'imm_bits': 0,
+    },
+    'I': {
+        'fields': (('opcode', 0, 7), ('rd', 7, 5), ('funct3', 12, 3), ('rs1', 15, 5)),
+        'imm': ((11, 0, 20),),
+        'imm_bits': 12,
+    },
+    'S': {
+        'fields': (('opcode', 0, 7), ('funct3', 12, 3), ('rs1', 15, 5), ('rs2', 20, 5)),
+        'imm': ((4, 0, 7), (11, 5, 25)),
+        'imm_bits': 12,
+    },
+    'B': {
+        'fields': (('opcode', 0, 7), ('funct3', 12, 3), ('rs1', 15, 5), ('rs2', 20, 5)),
+        'imm': ((11, 11, 7), (4, 1, 8), (10, 5, 25), (12, 12, 31)),
+        'imm_bits': 13,
+    },
+    'J': {
+        'fields': (('opcode', 0, 7), ('rd', 7, 5)),
+        'imm': ((19, 12, 12), (11, 11, 20), (10, 1, 21), (20, 20, 31)),
+        'imm_bits': 21,
+    },
+}
+
+key_fields = {
+    'R': (True, True),
+    'I': (True, False),
+    'S': (True, False),
+    'B': (True, False),
+    'J': (False, False),
+}
+
+opcode_format = {
+    51: 'R',
+    3: 'I',
+    19: 'I',
+    103: 'I',
+    35: 'S',
+    99: 'B',
+    111: 'J',
+}
+
+dispatch_keys = {
+    (51, 0, 0): 'add',
+    (51, 0, 32): 'sub',
+    (51, 2, 0): 'slt',
+    (51, 5, 0): 'srl',
+    (51, 6, 0): 'or',
+    (51, 7, 0): 'and',
+    (3, 2, None): 'lw',
+    (19, 0, None): 'addi',
+    (103, 0, None): 'jalr',
+    (35, 2, None): 'sw',
+    (99, 0, None): 'beq',
+    (99, 1, None): 'bne',
+    (99, 4, None): 'blt',
+    (111, None, None): 'jal',
+}
+
+def decode_immediate(fmt, word):
+    """Returns the sign-extended immediate of a word in format fmt."""
+    layout = FORMATS[fmt]
+    imm = 0
+    for high, low, shift in layout["imm"]:
+        imm |= ((word >> shift) & ((1 << (high - low + 1)) - 1)) << low
+    bits = layout["imm_bits"]
+    if bits and imm >> (bits - 1):
+        imm -= 1 << bits
+    return imm
+
+def dispatch_key(fmt, opcode, funct3, funct7):
+    # formats without a funct field leave it out of the key
+    has_funct3, has_funct7 = key_fields[fmt]
+    return (opcode, funct3 if has_funct3 else None, funct7 if has_funct7 else None)
+# ---- end of generated ISA section ----
+
+# opcode -> instruction format, used by the decoder to pick the immediate layout
+opcode_instruction = {opcode: fmt + "_Type" for opcode, fmt in opcode_format.items()}
+# one record per program line, built once by decode_instruction
+DecodedInstruction = namedtuple(
+    "DecodedInstruction",
+    ["opclass", "opcode", "funct3", "funct7", "rd", "rs1", "rs2", "imm", "handler"]
+)
+
+def to_signed(x):
+    if x >= 2**31:
+        return x - 2**32
+    return x
+
+
+
+
+class DataMemory:
+    """
+    Word-addressed data memory.
+    The data segment and the stack region are fixed-size arrays indexed with
+    integer arithmetic; any other address falls back to a sparse dict.
+    Only the data segment is part of the final memory dump.
+    """
+
+    DATA_BASE = 0x00010000
+    DATA_WORDS = 32
+    STACK_BASE = 0x00000100
+    STACK_WORDS = 32
+
+    def __init__(self):
+        self.data = array('I', [0]) * self.DATA_WORDS
+        self.stack = array('I', [0]) * self.STACK_WORDS
+        # stack words read as "not present" until written, like sparse ones
+        self.stack_written = bytearray(self.STACK_WORDS)
+        self.sparse = {}
+
+    def load(self, address):
+        """Returns the word at address, or None if it was never written."""
+        offset = address - self.DATA_BASE
+        if 0 <= offset < 4*self.DATA_WORDS and not offset & 3:
+            return self.data[offset >> 2]
+        offset = address - self.STACK_BASE
+        if 0 <= offset < 4*self.STACK_WORDS and not offset & 3:
+            if self.stack_written[offset >> 2]:
+                return self.stack[offset >> 2]
+            return None
+        return self.sparse.get(address)
+
+    def store(self, address, value):
+        offset = address - self.DATA_BASE
+        if 0 <= offset < 4*self.DATA_WORDS and not offset & 3:
+            self.data[offset >> 2] = value
+            return
+        offset = address - self.STACK_BASE
+        if 0 <= offset < 4*self.STACK_WORDS and not offset & 3:
+            self.stack[offset >> 2] = value
+            self.stack_written[offset >> 2] = 1
+            return
+        self.sparse[address] = value
+
+    def dump(self):
+        """Yields (address, value) for every data segment word, in order."""
+        base = self.DATA_BASE
+        for i, value in enumerate(self.data):
+            yield base + 4*i, value
+
+    def to_bytes(self):
+        """Packs the whole memory for a checkpoint (see from_bytes)."""
+        words = struct.Struct("<%dI" % (self.DATA_WORDS + self.STACK_WORDS))
+        parts = [words.pack(*self.data, *self.stack), bytes(self.stack_written),
+                 struct.pack("<I", len(self.sparse))]
+        parts += [struct.pack("<II", address, value) for address, value in self.sparse.items()]
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        memory = cls()
+        count = cls.DATA_WORDS + cls.STACK_WORDS
+        words = struct.unpack_from("<%dI" % count, data)
+        memory.data = array('I', words[:cls.DATA_WORDS])
+        memory.stack = array('I', words[cls.DATA_WORDS:])
+        offset = 4*count
+        memory.stack_written = bytearray(data[offset:offset + cls.STACK_WORDS])
+        offset += cls.STACK_WORDS
+        (sparse,) = struct.unpack_from("<I", data, offset)
+        for address, value in struct.iter_unpack("<II", data[offset + 4:offset + 4 + 8*sparse]):
+            memory.sparse[address] = value
+        return memory
+
+
+# 32-bit binary formatting for the traces and the memory dump. Values that
+# show up all the time (small numbers, small negative numbers, data segment
+# addresses) are formatted once at import; any other value goes through a
+# bounded LRU cache.
+
+FORMAT_CACHE_SIZE = 1 << 16
+
+def format_32bit(num):
+    return format(num % overflow, '#034b')  # two's complement, '0b' prefix
+
+common_32bit = {
+    num: format_32bit(num)
+    for num in chain(range(-2048, 4096), range(overflow - 2048, overflow),
+                     range(DataMemory.DATA_BASE, DataMemory.DATA_BASE + 4*DataMemory.DATA_WORDS, 4))
+}
+
+format_32bit_cached = lru_cache(maxsize=FORMAT_CACHE_SIZE)(format_32bit)
+
+def decimal_to_32bit(num):
+    binary_rep = common_32bit.get(num)
+    if binary_rep is None:
+        binary_rep = format_32bit_cached(num)
+    return binary_rep
+
+
+# Instruction handlers. Each takes the decoded record, the current PC,
+# the register file and data memory, and returns the next PC
+# (None means the halt instruction was reached).
+
+def exec_add(inst, pc, registers, memory):
+    registers[inst.rd] = (registers[inst.rs1] + registers[inst.rs2])%overflow
+    return pc + 4
+
+def exec_sub(inst, pc, registers, memory):
+    registers[inst.rd] = (registers[inst.rs1] - registers[inst.rs2])%overflow
+    return pc + 4
+
+def exec_slt(inst, pc, registers, memory):
+    if (to_signed(registers[inst.rs1]) < to_signed(registers[inst.rs2])):
+        registers[inst.rd] = 1
+    else:
+        registers[inst.rd] = 0
+    return pc + 4
+
+def exec_srl(inst, pc, registers, memory):
+    temp = registers[inst.rs2] % 16
+    registers[inst.rd] = (registers[inst.rs1] >> temp) %overflow
+    return pc + 4
+
+def exec_or(inst, pc, registers, memory):
+    registers[inst.rd] = registers[inst.rs1] | registers[inst.rs2]
+    return pc + 4
+
+def exec_and(inst, pc, registers, memory):
+    registers[inst.rd] = registers[inst.rs1] & registers[inst.rs2]
+    return pc + 4
+
+def exec_lw(inst, pc, registers, memory):
+    value = memory.load((registers[inst.rs1] + inst.imm) %overflow)
+    if (value is not None and inst.rd != 0):
+        registers[inst.rd] = value
+    return pc + 4
+
+def exec_addi(inst, pc, registers, memory):
+    if (inst.rd != 0):
+        registers[inst.rd] = (registers[inst.rs1] + inst.imm)%overflow
+    return pc + 4
+
+def exec_jalr(inst, pc, registers, memory):
+    # rd is written before rs1 is read, so rd == rs1 jumps relative to PC+4
+    if (inst.rd != 0):
+        registers[inst.rd] = pc+4
+    return (registers[inst.rs1] + inst.imm) %overflow
+
+def exec_sw(inst, pc, registers, memory):
+    memory.store((registers[inst.rs1] + inst.imm) %overflow, registers[inst.rs2])
+    return pc + 4
+
+def exec_beq(inst, pc, registers, memory):
+    if (registers[inst.rs1] == registers[inst.rs2]):
+        if (inst.imm == 0):
+            return None  # beq with offset 0 is the halt instruction
+        return pc + inst.imm
+    return pc + 4
+
+def exec_bne(inst, pc, registers, memory):
+    if (registers[inst.rs1] != registers[inst.rs2]):
+        return pc + inst.imm
+    return pc + 4
+
+def exec_blt(inst, pc, registers, memory):
+    if (to_signed(registers[inst.rs1]) < to_signed(registers[inst.rs2])):
+        return pc + inst.imm
+    return pc + 4
+
+def exec_jal(inst, pc, registers, memory):
+    if (inst.rd != 0):
+        registers[inst.rd] = pc + 4
+    return pc + inst.imm
+
+# mnemonic -> handler. The dispatch index (opcode, funct3, funct7) -> handler
+# is built from the generated dispatch_keys; funct7 is None for formats that do
+# not have it and funct3 is None for J-type. Adding an instruction means adding
+# it to ISA.INSTRUCTIONS (then running python3 ISA.py), its handler above and
+# one entry here.
+handlers = {
+    "add" : exec_add,
+    "sub" : exec_sub,
+    "slt" : exec_slt,
+    "srl" : exec_srl,
+    "or" : exec_or,
+    "and" : exec_and,
+    "lw" : exec_lw,
+    "addi" : exec_addi,
+    "jalr" : exec_jalr,
+    "sw" : exec_sw,
+    "beq" : exec_beq,
+    "bne" : exec_bne,
+    "blt" : exec_blt,
+    "jal" : exec_jal
+}
+dispatch_table = {key: handlers[mnemonic] for key, mnemonic in dispatch_keys.items()}
+
+# error raised when an opcode is known but its funct fields are not
+unsupported_messages = {
+    0b0110011 : "Unsupported R-type instruction",
+    0b0000011 : "Unsupported I-type (func3)",
+    0b0010011 : "Unsupported I-type (func3)",
+    0b1100111 : "Unsupported I-type",
+    0b0100011 : "Unsupported S-type",
+    0b1100011 : "Unsupported B-type"
+}
+
+def unsupported_handler(message):
+    def exec_unsupported(inst, pc, registers, memory):
+        raise Exception(message)
+    return exec_unsupported
+
+def decode_instruction(line):
+    """
+    Decodes one 32-bit binary text line into a DecodedInstruction record.
+    A line that is not 32 binary digits cannot execute.
+    """
+    if len(line) != 32 or line.strip("01"):
+        return DecodedInstruction(None, None, None, None, 0, 0, 0, 0,
+                                  unsupported_handler("Unsupported type of instruction"))
+    return decode_word(int(line, 2))
+
+def decode_word(word):
+    """
+    Decodes one 32-bit instruction word into a DecodedInstruction record.
+    Fields are extracted and immediates sign extended here, once per program line.
+    Unknown instructions still decode, so the error is raised only if they execute.
+    """
+    opcode = word & 0x7F
+    if opcode not in opcode_instruction:
+        return DecodedInstruction(None, None, None, None, 0, 0, 0, 0,
+                                  unsupported_handler("Unsupported type of instruction"))
+    funct3 = (word >> 12) & 0x7
+    funct7 = word >> 25
+    rd = (word >> 7) & 0x1F
+    fmt = opcode_format[opcode]
+    opclass = opcode_instruction[opcode]
+    imm = decode_immediate(fmt, word)
+    handler = dispatch_table.get(dispatch_key(fmt, opcode, funct3, funct7))
+    if handler is None or (opclass == "R_Type" and rd == 0):
+        # writes to x0 are rejected for R-type, as before
+        handler = unsupported_handler(unsupported_messages[opcode])
+    return DecodedInstruction(
+        opclass,
+        opcode,
+        funct3,
+        funct7,
+        rd,
+        (word >> 15) & 0x1F,
+        (word >> 20) & 0x1F,
+        imm,
+        handler
+    )
+
+def decode_program(lines):
+    # PC-indexed table: the instruction at PC lives at decoded[PC//4].
+    # A program is either text lines or integer words (see load_binary).
+    return [decode_word(line) if isinstance(line, int) else decode_instruction(line)
+            for line in lines]
+
+# Basic-block translation (--blocks). A block runs from its start PC up to
+# and including the first conditional branch or indirect jump, is compiled
+# once into a Python function and cached by start PC. An unconditional jal
+# does not end the block: translation continues at its target. How a block
+# traces depends on the sink's block_rows: "text" blocks build the rows of
+# the text traces themselves, with every constant PC already formatted, and
+# hand them to the writer in one write when the block exits; "state" blocks
+# write each row through write_state(pc, registers, rd). Without a trace
+# sink they write nothing. A block returns (next_pc, halted). A start PC is
+# only translated the second time it is reached; the first time its code is
+# interpreted, so code that runs once is never compiled.
+
+# most instructions translated into one block, straight-line or linked through jal
+MAX_BLOCK_LENGTH = 256
+
+def gen_add(inst, pc, row):
+    return [f"r[{inst.rd}] = (r[{inst.rs1}] + r[{inst.rs2}]) % {overflow}"]
+
+def gen_sub(inst, pc, row):
+    return [f"r[{inst.rd}] = (r[{inst.rs1}] - r[{inst.rs2}]) % {overflow}"]
+
+def gen_slt(inst, pc, row):
+    return [f"r[{inst.rd}] = 1 if to_signed(r[{inst.rs1}]) < to_signed(r[{inst.rs2}]) else 0"]
+
+def gen_srl(inst, pc, row):
+    return [f"r[{inst.rd}] = (r[{inst.rs1}] >> (r[{inst.rs2}] % 16)) % {overflow}"]
+
+def gen_or(inst, pc, row):
+    return [f"r[{inst.rd}] = r[{inst.rs1}] | r[{inst.rs2}]"]
+
+def gen_and(inst, pc, row):
+    return [f"r[{inst.rd}] = r[{inst.rs1}] & r[{inst.rs2}]"]
+
+def gen_lw(inst, pc, row):
+    if inst.rd == 0:
+        return []
+    return [f"v = memory.load((r[{inst.rs1}] + {inst.imm}) % {overflow})",
+            f"if v is not None: r[{inst.rd}] = v"]
+
+def gen_addi(inst, pc, row):
+    if inst.rd == 0:
+        return []
+    return [f"r[{inst.rd}] = (r[{inst.rs1}] + {inst.imm}) % {overflow}"]
+
+def gen_sw(inst, pc, row):
+    return [f"memory.store((r[{inst.rs1}] + {inst.imm}) % {overflow}, r[{inst.rs2}])"]
+
+def gen_jalr(inst, pc, row):
+    code = []
+    if inst.rd != 0:
+        code.append(f"r[{inst.rd}] = {pc + 4}")
+    return code + [f"t = (r[{inst.rs1}] + {inst.imm}) % {overflow}"] + row("t", inst) + ["return t, False"]
+
+def gen_branch(condition, inst, pc, row, halt=False):
+    # conditional branch: taken path indented under the condition, then the fall-through
+    if halt:
+        taken = row(pc, inst) + [f"return {pc + 4}, True"]
+    else:
+        taken = row(pc + inst.imm, inst) + [f"return {pc + inst.imm}, False"]
+    return ([f"if {condition}:"] + ["    " + line for line in taken] +
+            row(pc + 4, inst) + [f"return {pc + 4}, False"])
+
+def gen_beq(inst, pc, row):
+    return gen_branch(f"r[{inst.rs1}] == r[{inst.rs2}]", inst, pc, row, halt=inst.imm == 0)
+
+def gen_bne(inst, pc, row):
+    return gen_branch(f"r[{inst.rs1}] != r[{inst.rs2}]", inst, pc, row)
+
+def gen_blt(inst, pc, row):
+    return gen_branch(f"to_signed(r[{inst.rs1}]) < to_signed(r[{inst.rs2}])", inst, pc, row)
+
+def gen_jal(inst, pc, row):
+    # translate_block either continues at the target or returns it
+    code = []
+    if inst.rd != 0:
+        code.append(f"r[{inst.rd}] = {pc + 4}")
+    return code + row(pc + inst.imm, inst)
+
+# handler -> code generator. Straight-line generators leave the trace row to
+# translate_block; the ones in block_terminators end the block themselves,
+# except jal, which translate_block links to its target when it can.
+# Handlers without a generator are called directly and also end the block.
+block_generators = {
+    exec_add : gen_add,
+    exec_sub : gen_sub,
+    exec_slt : gen_slt,
+    exec_srl : gen_srl,
+    exec_or : gen_or,
+    exec_and : gen_and,
+    exec_lw : gen_lw,
+    exec_addi : gen_addi,
+    exec_sw : gen_sw,
+    exec_jalr : gen_jalr,
+    exec_beq : gen_beq,
+    exec_bne : gen_bne,
+    exec_blt : gen_blt,
+    exec_jal : gen_jal
+}
+
+block_terminators = {exec_jalr, exec_beq, exec_bne, exec_blt, exec_jal}
+
+def trace_row(next_pc, inst):
+    # an instruction can only have written its rd field
+    return [f"w({next_pc}, r, {inst.rd})"]
+
+# handlers whose rd field is part of an immediate, not a register they write
+no_destination = {exec_sw, exec_beq, exec_bne, exec_blt}
+
+def text_row(next_pc, inst):
+    # re-format rd only if it changed, then append both rows to the block's lists
+    rd = inst.rd
+    code = []
+    if inst.handler not in no_destination:
+        code = [f"if r[{rd}] != vals[{rd}]:",
+                f"    v = vals[{rd}] = r[{rd}]",
+                f"    bp[{rd}] = common_32bit.get(v) or f32(v); dp[{rd}] = str(v)",
+                "    b = ' '.join(bp) + ' \\n'; d = ' '.join(dp) + ' \\n'"]
+    if isinstance(next_pc, int):
+        return code + [f"rows += ({decimal_to_32bit(next_pc) + ' '!r}, b)",
+                       f"drows += ({str(next_pc) + ' '!r}, d)"]
+    return code + [f"rows += (f32({next_pc}), ' ', b)",
+                   f"drows += (str({next_pc}), ' ', d)"]
+
+def no_row(next_pc, inst):
+    return []
+
+block_rows = {None: no_row, "state": trace_row, "text": text_row}
+
+def translate_block(decoded, start_pc, rows="state"):
+    """
+    Compiles the basic block starting at start_pc into a function
+    block(r, memory, w) -> (next_pc, halted). rows is the trace sink's
+    block_rows, or None without a sink; w is the sink's write_state for
+    "state" blocks and the sink itself for "text" blocks.
+    Every exit is after the last instruction, so a block always executes
+    all of its instructions. Returns the function and that number.
+    """
+    namespace = {"to_signed": to_signed, "f32": decimal_to_32bit, "common_32bit": common_32bit}
+    row = block_rows[rows]
+    body = []
+    pc = start_pc
+    visited = set()
+    while True:
+        if pc >= 4*len(decoded):
+            # ran off the end of the program without a branch
+            body.append(f"return {pc}, False")
+            break
+        visited.add(pc)
+        inst = decoded[pc//4]
+        gen = block_generators.get(inst.handler)
+        if gen is None:
+            namespace[f"h{pc}"] = inst.handler
+            namespace[f"i{pc}"] = inst
+            body += [f"npc = h{pc}(i{pc}, {pc}, r, memory)",
+                     "if npc is None:"]
+            body += ["    " + line for line in row(pc, inst)]
+            body += [f"    return {pc + 4}, True"]
+            body += row("npc", inst) + ["return npc, False"]
+            break
+        body += gen(inst, pc, row)
+        if inst.handler is exec_jal:
+            target = pc + inst.imm
+            if (target in visited or not 0 <= target < 4*len(decoded)
+                    or len(visited) >= MAX_BLOCK_LENGTH):
+                body.append(f"return {target}, False")
+                break
+            pc = target
+            continue
+        if inst.handler in block_terminators:
+            break
+        body += row(pc + 4, inst)
+        pc += 4
+        if len(visited) >= MAX_BLOCK_LENGTH:
+            # long straight-line code is split into several blocks
+            body.append(f"return {pc}, False")
+            break
+    if rows == "text":
+        # the rows are written on every exit, including an exception part-way through
+        body = (["vals, bp, dp = w.values, w.binary_parts, w.decimal_parts",
+                 "b, d = w.joined_rows()",
+                 "rows = []",
+                 "drows = []",
+                 "try:"] + ["    " + line for line in body] +
+                ["finally:",
+                 "    w.write_block(rows, drows, b, d)"])
+    source = "def block(r, memory, w):\n" + "".join("    " + line + "\n" for line in body)
+    exec(compile(source, f"<block {start_pc}>", "exec"), namespace)
+    return namespace["block"], len(visited)
+
+def load_instructions(filename):
+    if filename.endswith(".bin"):
+        return load_binary(filename)
+    with open(filename, 'r') as f:
+        lines = [line.strip() for line in f]
+    return lines
+
+def load_binary(filename):
+    """
+    Loads a .bin program: raw 32-bit little-endian words, one per instruction.
+    Returns an array('I') of instruction words.
+    """
+    words = array('I')
+    with open(filename, 'rb') as f:
+        size = f.seek(0, 2)
+        if size % 4:
+            raise Exception("Binary program size is not a multiple of 4 bytes")
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                words.frombytes(data)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words
+
+class TraceWriter:
+    """
+    Writes the binary trace and the decimal (_r.txt) trace.
+    Both files are opened once for the whole run and written through a large
+    buffer; use it as a context manager so they are closed even on errors.
+    The formatted text of every register is kept between rows, so a row only
+    re-formats the registers whose value changed.
+    """
+
+    BUFFER_SIZE = 1 << 20
+    # translated blocks build the text rows themselves (see translate_block)
+    block_rows = "text"
+
+    def __init__(self, output_file, output_decimal, position=None):
+        # position (from a checkpoint) continues existing traces from that point
+        if position is None:
+            self.trace = open(output_file, 'w', buffering=self.BUFFER_SIZE)
+            self.decimal = open(output_decimal, 'w', buffering=self.BUFFER_SIZE)
+        else:
+            self.trace = reopen_trace(output_file, 'r+', position[0], self.BUFFER_SIZE)
+            self.decimal = reopen_trace(output_decimal, 'r+', position[1], self.BUFFER_SIZE)
+        self.clear_row_cache()
+
+    def clear_row_cache(self):
+        # register values of the last row, their formatted text, and the
+        # joined register part of both rows (None when it must be rebuilt)
+        self.values = [None] * 32
+        self.binary_parts = [None] * 32
+        self.decimal_parts = [None] * 32
+        self.binary_row = None
+        self.decimal_row = None
+
+    def write_row(self, trace_array, new_trace_array):
+        self.trace.write(" ".join(trace_array) + " \n")
+        self.decimal.write(" ".join(map(str, new_trace_array)) + " \n")
+
+    def write_state(self, pc, registers, written=None):
+        """
+        Writes the row for one executed instruction.
+        written is the only register index that can have changed since the
+        last row, or None to check all of them.
+        """
+        values = self.values
+        for i in (range(32) if written is None else (written,)):
+            value = registers[i]
+            if value != values[i]:
+                values[i] = value
+                self.binary_parts[i] = decimal_to_32bit(value)
+                self.decimal_parts[i] = str(value)
+                self.binary_row = None
+        if self.binary_row is None:
+            self.binary_row = " ".join(self.binary_parts) + " \n"
+            self.decimal_row = " ".join(self.decimal_parts) + " \n"
+        self.trace.write(decimal_to_32bit(pc) + " " + self.binary_row)
+        self.decimal.write(str(pc) + " " + self.decimal_row)
+
+    def joined_rows(self):
+        """Register part of the current binary and decimal row, for a translated block."""
+        if self.binary_row is None:
+            self.binary_row = " ".join(self.binary_parts) + " \n"
+            self.decimal_row = " ".join(self.decimal_parts) + " \n"
+        return self.binary_row, self.decimal_row
+
+    def write_block(self, rows, decimal_rows, binary_row, decimal_row):
+        """
+        Writes the rows produced by a translated block, which has kept the
+        register cache up to date; binary_row and decimal_row are its last
+        joined register parts.
+        """
+        self.trace.write("".join(rows))
+        self.decimal.write("".join(decimal_rows))
+        self.binary_row = binary_row
+        self.decimal_row = decimal_row
+
+    def write_memory(self, memory):
+        self.write_dump(memory.dump())
+
+    def write_dump(self, words):
+        """Writes the memory dump from (address, value) pairs."""
+        trace_rows = []
+        decimal_rows = []
+        for address, value in words:
+            address = f"0x{address:08X}:"
+            trace_rows.append(address + decimal_to_32bit(value) + "\n")
+            decimal_rows.append(address + str(value) + "\n")
+        self.trace.write("".join(trace_rows))
+        self.decimal.write("".join(decimal_rows))
+
+    def position(self):
+        """Flushes both files and returns where they end, for a checkpoint."""
+        self.trace.flush()
+        self.decimal.flush()
+        return [self.trace.tell(), self.decimal.tell()]
+
+    def close(self):
+        self.trace.close()
+        self.decimal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class HashSink:
+    """File-like sink that keeps only the SHA-256 of the text written to it."""
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode()
+        self.digest.update(data)
+        self.size += len(data)
+
+    def flush(self):
+        pass
+
+    def tell(self):
+        return self.size
+
+    def close(self):
+        pass
+
+class CompareSink:
+    """
+    File-like sink that checks the text written to it against an expected
+    file as it arrives. Lines are compared the way the grader does: surrounding
+    whitespace and blank lines are ignored on both sides. mismatch is the
+    number of the first differing non-blank line (or the line where one side
+    ends early, known after close), or None.
+    """
+
+    def __init__(self, expected_file):
+        self.file = open(expected_file, 'r')
+        self.expected = (line for line in map(str.strip, self.file) if line)
+        self.partial = ""
+        self.line = 0
+        self.mismatch = None
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+        if self.mismatch is not None:
+            return
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self.compare(line)
+
+    def compare(self, line):
+        line = line.strip()
+        if not line or self.mismatch is not None:
+            return
+        self.line += 1
+        if next(self.expected, None) != line:
+            self.mismatch = self.line
+
+    def flush(self):
+        pass
+
+    def tell(self):
+        return self.size
+
+    def close(self):
+        self.compare(self.partial)
+        if self.mismatch is None and next(self.expected, None) is not None:
+            self.mismatch = self.line + 1
+        self.file.close()
+
+class TraceHasher(TraceWriter):
+    """A TraceWriter that hashes both text traces instead of writing them."""
+
+    def __init__(self):
+        self.trace = HashSink()
+        self.decimal = HashSink()
+        self.clear_row_cache()
+
+    def hexdigests(self):
+        """SHA-256 of the trace and of the _r.txt trace, as sha256sum prints them."""
+        return self.trace.digest.hexdigest(), self.decimal.digest.hexdigest()
+
+class TraceComparator(TraceWriter):
+    """
+    A TraceWriter that compares both text traces with expected files while
+    they are produced, without writing anything. Without an expected _r.txt
+    trace only the main trace is compared, as the grader does.
+    """
+
+    def __init__(self, expected_file, expected_decimal=None):
+        self.trace = CompareSink(expected_file)
+        self.decimal = CompareSink(expected_decimal) if expected_decimal is not None else HashSink()
+        self.clear_row_cache()
+
+    def mismatches(self):
+        """
+        First differing line of the trace and of the _r.txt trace (None if
+        equal or not compared); valid after close.
+        """
+        return self.trace.mismatch, getattr(self.decimal, "mismatch", None)
+
+class BinaryTraceWriter:
+    """
+    Writes a packed binary trace (.trc) with the same interface as TraceWriter.
+    Each step stores the PC and only the registers that changed since the
+    previous step; every SNAPSHOT_INTERVAL steps all registers are stored, so
+    a reader can start from any snapshot. read_binary_trace() decodes it and
+    TraceExpand.py turns it back into the two text traces.
+    """
+
+    BUFFER_SIZE = 1 << 20
+    SNAPSHOT_INTERVAL = 1024
+    # translated blocks call write_state for each row
+    block_rows = "state"
+    MAGIC = b"RVTRACE1"
+
+    # record tags
+    SNAPSHOT = 0
+    DELTA = 1
+    MEMORY = 2
+
+    snapshot_record = struct.Struct("<Bq32I")   # tag, pc, x0..x31
+    delta_header = struct.Struct("<BqB")        # tag, pc, number of changed registers
+    delta_entry = struct.Struct("<BI")          # register index, new value
+    memory_header = struct.Struct("<BI")        # tag, number of words
+    memory_entry = struct.Struct("<II")         # address, value
+
+    def __init__(self, output_file, position=None):
+        if position is None:
+            self.trace = open(output_file, 'wb', buffering=self.BUFFER_SIZE)
+            self.trace.write(self.MAGIC)
+            self.rows = 0
+        else:
+            # continuing from a checkpoint always starts with a snapshot
+            self.trace = reopen_trace(output_file, 'r+b', position[0], self.BUFFER_SIZE)
+            self.rows = position[1]
+        self.last = None
+
+    def write_row(self, trace_array, new_trace_array):
+        self.write_state(new_trace_array[0], new_trace_array[1:])
+
+    def write_state(self, pc, registers, written=None):
+        last = self.last
+        if last is None or self.rows % self.SNAPSHOT_INTERVAL == 0:
+            self.trace.write(self.snapshot_record.pack(self.SNAPSHOT, pc, *registers))
+            self.last = list(registers)
+        else:
+            if written is None:
+                changed = [i for i, (new, old) in enumerate(zip(registers, last)) if new != old]
+            else:
+                changed = [written] if registers[written] != last[written] else []
+            record = [self.delta_header.pack(self.DELTA, pc, len(changed))]
+            for i in changed:
+                record.append(self.delta_entry.pack(i, registers[i]))
+                last[i] = registers[i]
+            self.trace.write(b"".join(record))
+        self.rows += 1
+
+    def write_memory(self, memory):
+        self.write_dump(memory.dump())
+
+    def write_dump(self, words):
+        words = list(words)
+        record = [self.memory_header.pack(self.MEMORY, len(words))]
+        for address, value in words:
+            record.append(self.memory_entry.pack(address, value))
+        self.trace.write(b"".join(record))
+
+    def position(self):
+        self.trace.flush()
+        return [self.trace.tell(), self.rows]
+
+    def close(self):
+        self.trace.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def reopen_trace(filename, mode, offset, buffering):
+    # drops whatever was written after offset and continues from there
+    f = open(filename, mode, buffering=buffering)
+    f.truncate(offset)
+    f.seek(offset)
+    return f
+
+def read_binary_trace(filename):
+    """
+    Decodes a .trc file written by BinaryTraceWriter.
+    Yields ("row", pc, registers) for every step and ("memory", address, value)
+    for every word of the memory dump, in the order they were written.
+    """
+    writer = BinaryTraceWriter
+    with open(filename, 'rb') as f:
+        if f.seek(0, 2) < len(writer.MAGIC):
+            raise Exception("Not a binary trace file")
+        # mapped rather than read, so a long trace is never held in memory at once
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from decode_binary_trace(data)
+
+def decode_binary_trace(data):
+    # the records of read_binary_trace, from any buffer holding a whole .trc file
+    writer = BinaryTraceWriter
+    if data[:len(writer.MAGIC)] != writer.MAGIC:
+        raise Exception("Not a binary trace file")
+    offset = len(writer.MAGIC)
+    registers = None
+    while offset < len(data):
+        tag = data[offset]
+        if tag == writer.SNAPSHOT:
+            fields = writer.snapshot_record.unpack_from(data, offset)
+            offset += writer.snapshot_record.size
+            pc = fields[1]
+            registers = list(fields[2:])
+        elif tag == writer.DELTA and registers is not None:
+            _, pc, count = writer.delta_header.unpack_from(data, offset)
+            offset += writer.delta_header.size
+            for _ in range(count):
+                i, value = writer.delta_entry.unpack_from(data, offset)
+                offset += writer.delta_entry.size
+                registers[i] = value
+        elif tag == writer.MEMORY:
+            _, count = writer.memory_header.unpack_from(data, offset)
+            offset += writer.memory_header.size
+            for _ in range(count):
+                yield ("memory",) + writer.memory_entry.unpack_from(data, offset)
+                offset += writer.memory_entry.size
+            continue
+        else:
+            raise Exception("Corrupt binary trace file")
+        yield "row", pc, registers[:]
+
+class Profiler:
+    """
+    Execution statistics for --profile: per-instruction counts and host time,
+    a PC histogram, basic-block hotness and beq/bne/blt outcomes.
+    Machine.load wraps every decoded handler when a profiler is set, so a run
+    without one executes exactly the same code as before.
+    A block here is the run of instructions from a control transfer target
+    (or PC 0) up to the next branch or jump.
+    """
+
+    TOP = 20  # rows of each table in the text report
+
+    def __init__(self):
+        self.counts = Counter()     # instruction name -> executions
+        self.times = Counter()      # instruction name -> host nanoseconds
+        self.pcs = Counter()        # pc -> executions
+        self.blocks = Counter()     # block start pc -> executions
+        self.branches = {}          # pc -> [taken, not taken]
+        self.block_start = True
+        self.decoded = []
+
+    def instrument(self, decoded):
+        self.decoded = decoded
+        return [inst._replace(handler=self.wrap(inst.handler)) for inst in decoded]
+
+    def wrap(self, handler):
+        name = handler.__name__[len("exec_"):] if handler in block_generators else "unsupported"
+        branch = handler in (exec_beq, exec_bne, exec_blt)
+        control = handler in block_terminators
+        counts, times, pcs, blocks, branches = self.counts, self.times, self.pcs, self.blocks, self.branches
+        clock = time.perf_counter_ns
+
+        def profiled(inst, pc, registers, memory):
+            if self.block_start:
+                blocks[pc] += 1
+            pcs[pc] += 1
+            start = clock()
+            next_pc = handler(inst, pc, registers, memory)
+            times[name] += clock() - start
+            counts[name] += 1
+            if branch:
+                # the halt instruction counts as taken
+                branches.setdefault(pc, [0, 0])[next_pc == pc + 4] += 1
+            self.block_start = control
+            return next_pc
+        return profiled
+
+    def block_length(self, start):
+        # instructions from start up to and including the first branch or jump
+        end = start//4
+        while end < len(self.decoded) - 1 and self.decoded[end].handler not in block_terminators:
+            end += 1
+        return end - start//4 + 1
+
+    def report(self):
+        """Returns the statistics as a JSON-ready dict."""
+        return {
+            "instructions": {name: {"count": self.counts[name], "time_ns": self.times[name]}
+                             for name, _ in self.counts.most_common()},
+            "pcs": {str(pc): count for pc, count in sorted(self.pcs.items())},
+            "blocks": [{"start": pc, "count": count, "length": self.block_length(pc)}
+                       for pc, count in self.blocks.most_common()],
+            "branches": [{"pc": pc, "instruction": self.decoded[pc//4].handler.__name__[len("exec_"):],
+                          "taken": taken, "not_taken": not_taken}
+                         for pc, (taken, not_taken) in sorted(self.branches.items())],
+        }
+
+    def report_text(self):
+        total = sum(self.counts.values()) or 1
+        lines = ["Instructions executed: %d" % sum(self.counts.values()), "",
+                 "%-12s %12s %8s %14s %10s" % ("instruction", "count", "%", "host time ms", "ns/instr")]
+        for name, count in self.counts.most_common():
+            lines.append("%-12s %12d %7.2f%% %14.3f %10.1f" % (
+                name, count, 100*count/total, self.times[name]/1e6, self.times[name]/count))
+        lines += ["", "Hottest PCs", "%-12s %12s %8s" % ("pc", "count", "%")]
+        for pc, count in self.pcs.most_common(self.TOP):
+            lines.append("%-12d %12d %7.2f%%" % (pc, count, 100*count/total))
+        lines += ["", "Hottest blocks", "%-12s %12s %8s %14s" % ("start pc", "count", "length", "instructions")]
+        for pc, count in self.blocks.most_common(self.TOP):
+            length = self.block_length(pc)
+            lines.append("%-12d %12d %8d %14d" % (pc, count, length, count*length))
+        lines += ["", "Branches", "%-12s %-12s %12s %12s" % ("pc", "instruction", "taken", "not taken")]
+        for pc, (taken, not_taken) in sorted(self.branches.items()):
+            lines.append("%-12d %-12s %12d %12d" % (
+                pc, self.decoded[pc//4].handler.__name__[len("exec_"):], taken, not_taken))
+        return "\n".join(lines) + "\n"
+
+    def write(self, text_file, json_file):
+        with open(text_file, 'w') as f:
+            f.write(self.report_text())
+        with open(json_file, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+class Machine:
+    """
+    A simulated machine: register file, PC, data memory and an optional
+    trace sink (a TraceWriter or BinaryTraceWriter, or None to run without tracing).
+    Several machines can live in one process; nothing is kept in module globals.
+    The whole state can be saved to a checkpoint file and restored later.
+    """
+
+    CHECKPOINT_MAGIC = b"RVCKPT01"
+    # magic, program digest, pc, steps, halted, x0..x31, number of trace position values;
+    # followed by the trace position values (q each) and DataMemory.to_bytes()
+    checkpoint_header = struct.Struct("<8s32sqQB32IB")
+
+    def __init__(self, trace=None, translate=False, profile=None):
+        self.trace = trace
+        self.translate = translate
+        self.profile = profile
+        self.load([])
+
+    def load(self, program):
+        """Resets the machine state and loads a program (32-bit binary lines or integer words)."""
+        self.registers = [0] * 32
+        self.registers[2] = 380  # stack pointer
+        self.pc = 0
+        self.memory = DataMemory()
+        self.steps = 0
+        self.halted = False
+        self.decoded = decode_program(program)
+        if self.profile is not None:
+            self.decoded = self.profile.instrument(self.decoded)
+        self.blocks = {}  # (start pc, block_rows) -> (translated block, length)
+        self.entered = set()  # PCs already reached once in translated mode
+        # registers changed outside an instruction: the next traced row
+        # has to compare all of them, not just the one written
+        self.trace_synced = False
+
+    def step(self):
+        """Executes one instruction and returns True if it was the halt instruction."""
+        pc = self.pc
+        if (pc//4 < 0):
+            raise Exception("PC out of bounds")
+        registers = self.registers
+        inst = self.decoded[pc//4]
+        next_pc = inst.handler(inst, pc, registers, self.memory)
+        self.steps += 1
+        if (next_pc is None):
+            # halt: the trace shows the PC of the halting beq itself
+            self.pc = pc + 4
+            self.halted = True
+            trace_pc = pc
+        else:
+            self.pc = trace_pc = next_pc
+        if self.trace is not None:
+            # an instruction can only have written its rd field
+            self.trace.write_state(trace_pc, registers, inst.rd if self.trace_synced else None)
+            self.trace_synced = True
+        return self.halted
+
+    def run(self, program=None, max_steps=None):
+        """
+        Runs until the halt instruction, or until max_steps instructions have
+        executed. Loads program first if one is given. Returns True on halt.
+        """
+        if program is not None:
+            self.load(program)
+        if self.translate:
+            self.run_translated(max_steps)
+        else:
+            while not self.halted and self.pc < 4*len(self.decoded):
+                if max_steps is not None and self.steps >= max_steps:
+                    return False
+                self.step()
+        if max_steps is not None and not self.halted and self.steps >= max_steps:
+            return False
+        if not self.halted:
+            raise Exception("Halt not detected")
+        return True
+
+    def run_translated(self, max_steps):
+        traced = self.trace is not None
+        rows = self.trace.block_rows if traced else None
+        sink = None
+        if traced:
+            sink = self.trace if rows == "text" else self.trace.write_state
+        while not self.halted and self.pc < 4*len(self.decoded):
+            if max_steps is not None and self.steps >= max_steps:
+                return
+            if (self.pc//4 < 0):
+                raise Exception("PC out of bounds")
+            if traced and not self.trace_synced:
+                # blocks only pass the written register, so sync the sink first
+                self.step()
+                continue
+            entry = self.blocks.get((self.pc, rows))
+            if entry is None:
+                if self.pc not in self.entered:
+                    # code reached only once is cheaper to interpret than to compile
+                    self.entered.add(self.pc)
+                    self.step()
+                    continue
+                entry = self.blocks[self.pc, rows] = translate_block(self.decoded, self.pc, rows)
+            block, length = entry
+            if max_steps is not None and self.steps + length > max_steps:
+                # finish the last partial block one instruction at a time
+                self.step()
+                continue
+            self.pc, self.halted = block(self.registers, self.memory, sink)
+            self.steps += length
+
+    def program_digest(self):
+        # identifies the decoded program, so a checkpoint only resumes the program it came from
+        return hashlib.sha256(repr([inst[:-1] for inst in self.decoded]).encode()).digest()
+
+    def save_checkpoint(self, filename):
+        """
+        Saves PC, registers, memory, instruction count and the trace position
+        to filename. The file is replaced atomically.
+        """
+        position = self.trace.position() if self.trace is not None else []
+        data = (self.checkpoint_header.pack(self.CHECKPOINT_MAGIC, self.program_digest(), self.pc,
+                                            self.steps, self.halted, *self.registers, len(position))
+                + struct.pack("<%dq" % len(position), *position)
+                + self.memory.to_bytes())
+        temp = filename + ".tmp"
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, filename)
+
+    def restore_checkpoint(self, filename):
+        """
+        Restores a checkpoint written by save_checkpoint. The same program must
+        already be loaded. Returns the saved trace position, which the trace
+        writer takes to continue the trace files from that point.
+        """
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if not data.startswith(self.CHECKPOINT_MAGIC):
+            raise Exception("Not a checkpoint file")
+        fields = self.checkpoint_header.unpack_from(data)
+        if fields[1] != self.program_digest():
+            raise Exception("Checkpoint was made with a different program")
+        self.pc, self.steps, self.halted = fields[2], fields[3], bool(fields[4])
+        self.registers = list(fields[5:37])
+        count = fields[37]
+        offset = self.checkpoint_header.size
+        position = list(struct.unpack_from("<%dq" % count, data, offset))
+        self.memory = DataMemory.from_bytes(data[offset + 8*count:])
+        self.trace_synced = False
+        return position
+
+def open_trace(output_file, position=None):
+    # a .trc output name selects the packed binary trace
+    if output_file.endswith(".trc"):
+        return BinaryTraceWriter(output_file, position)
+    return TraceWriter(output_file, output_file.replace(".txt", "_r.txt"), position)
+
+def option_value(name, default=None):
+    # value of "--name VALUE" among the options after the two file names
+    options = sys.argv[3:]
+    if name in options and options.index(name) + 1 < len(options):
+        return options[options.index(name) + 1]
+    return default
+
+def main():
+    # if len(sys.argv) != 3:
+    #     print("Usage: python Simulator.py <input_binary_file> <output_trace_file>")
+    #     sys.exit(1)
+    input_file = sys.argv[1]
+    output_file = sys.argv[2]
+    #output_file = "new.txt"
+    #input_file = "file.txt"
+    lines = load_instructions(input_file)
+    # registers, PC, data_memory = init_state()
+    # run_simulation(instructions, registers, PC, data_memory, output_file)
+    # lines = load_instructions("file.txt")
+
+    # --checkpoint FILE saves the state every --checkpoint-every steps;
+    # --resume FILE continues a run (and its trace files) from such a file
+    checkpoint = option_value("--checkpoint")
+    checkpoint_every = int(option_value("--checkpoint-every", 1000000))
+    resume = option_value("--resume")
+
+    # --profile writes <output>_profile.txt and <output>_profile.json
+    profile = Profiler() if "--profile" in sys.argv[3:] else None
+
+    machine = Machine(translate="--blocks" in sys.argv[3:], profile=profile)
+    machine.load(lines)
+    position = machine.restore_checkpoint(resume) if resume is not None else None
+    try:
+        with open_trace(output_file, position) as writer:
+            machine.trace = writer
+            if checkpoint is None:
+                machine.run()
+            else:
+                while not machine.run(max_steps=machine.steps + checkpoint_every):
+                    machine.save_checkpoint(checkpoint)
+            writer.write_memory(machine.memory)
+    finally:
+        # a run that failed is still worth a profile
+        if profile is not None:
+            base = os.path.splitext(output_file)[0]
+            profile.write(base + "_profile.txt", base + "_profile.json")
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,24 @@
+# Expands a binary trace (.trc) written by Simulator.py into the text traces
+# Simulator.py writes by default: <output>.txt and <output>_r.txt
+import sys
+from Simulator import TraceWriter, read_binary_trace
+
+def expand_trace(trace_file, output_file):
+    output_decimal = output_file.replace(".txt", "_r.txt")
+    with TraceWriter(output_file, output_decimal) as writer:
+        dump = []
+        for kind, first, second in read_binary_trace(trace_file):
+            if kind == "row":
+                writer.write_state(first, second)
+            else:
+                dump.append((first, second))
+        writer.write_dump(dump)
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python TraceExpand.py <input_trace.trc> <output_trace_file>")
+        sys.exit(1)
+    expand_trace(sys.argv[1], sys.argv[2])
+
+if __name__ == "__main__":
+    main()
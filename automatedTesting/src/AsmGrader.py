@@ -3,7 +3,13 @@
 from colors import bcolors
 
 from Grader import Grader
+import contextlib
+import importlib.util
+import io
 import os
+import sys
+import threading
+import traceback
 
 class AsmGrader(Grader):
 
@@ -19,98 +25,155 @@ class AsmGrader(Grader):
 	BIN_HARD_DIR = "bin_h"
 	BIN_SIMPLE_DIR = "bin_s"
 
-	def __init__(self, verb, enable,operating_system):
-		super().__init__(verb, enable,operating_system)
+	# stdout/stderr redirection is process-wide, so in-process runs take turns
+	inProcessLock = threading.Lock()
+
+	# Imports the submission in a child process, under the usual timeout and
+	# rlimits, and prints "assemble_file" if the import finished and defined it.
+	IMPORT_PROBE = (
+		"import contextlib, importlib.util, io, sys\n"
+		"spec = importlib.util.spec_from_file_location('submission_assembler', sys.argv[1])\n"
+		"module = importlib.util.module_from_spec(spec)\n"
+		"sys.argv = sys.argv[1:]\n"
+		"with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):\n"
+		"\tspec.loader.exec_module(module)\n"
+		"print('assemble_file' if hasattr(module, 'assemble_file') else '')\n"
+	)
+
+	def __init__(self, verb, enable,operating_system, jobs=1, quiet=False, submission=None, timeout=None, cache=None, inProcess=False):
+		super().__init__(verb, enable,operating_system, jobs, quiet, timeout, cache)
 		self.enable = enable
 		self.operating_system == operating_system
-
-		if self.operating_system == 'linux':
-			self.ASM_RUN_DIR = "../SimpleAssembler/"
-		elif self.operating_system == 'windows':
-			self.ASM_RUN_DIR = "..\SimpleAssembler\\"
-
+		self.inProcess = inProcess
+		self.assemblerModule = None
+		self.assemblerLoaded = False
+		self.loadLock = threading.Lock()
+
+		# absolute paths, so tests never need to chdir
+		self.ASM_TEST_DIR = os.path.abspath(os.path.join("tests", "assembly"))
+		if submission is None:
+			self.ASM_RUN_DIR = os.path.abspath(os.path.join("..", "SimpleAssembler"))
+			self.USER_DIR = self.ASM_TEST_DIR
+		else:
+			# batch mode: each submission keeps its generated files to itself
+			self.ASM_RUN_DIR = os.path.abspath(os.path.join(submission, "SimpleAssembler"))
+			self.USER_DIR = os.path.abspath(os.path.join(submission, "grader_output", "assembly"))
+
+	def loadAssembler(self):
+		# Imports the submission once. Returns None when it cannot be imported
+		# or has no assemble_file() function, e.g. a script that runs at import;
+		# the tests then run it as a program, with the usual limits.
+		with self.loadLock:
+			if not self.assemblerLoaded:
+				self.assemblerLoaded = True
+				path = os.path.join(self.ASM_RUN_DIR, "Assembler.py")
+				# an import that hangs or blows up would take the grader with it,
+				# so it is tried in a limited child process first
+				output, status = self.runProgram(['python3', '-c', self.IMPORT_PROBE, path], self.ASM_RUN_DIR)
+				if status != self.OK or output.split()[-1:] != ["assemble_file"]:
+					return None
+				spec = importlib.util.spec_from_file_location("submission_assembler_" + str(id(self)), path)
+				module = importlib.util.module_from_spec(spec)
+				savedArgv = sys.argv
+				try:
+					with self.inProcessLock, contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+						sys.argv = [path]
+						try:
+							spec.loader.exec_module(module)
+						finally:
+							sys.argv = savedArgv
+				except (Exception, SystemExit):
+					module = None
+				if module is not None and hasattr(module, "assemble_file"):
+					self.assemblerModule = module
+			return self.assemblerModule
+
+	def runAssembler(self, assembly_file, machine_code_file):
+		# runs the assembler from its own directory, returns (console output, status)
+		module = self.loadAssembler() if self.inProcess else None
+		if module is None:
+			return self.runProgram(['python3', 'Assembler.py', assembly_file, machine_code_file], self.ASM_RUN_DIR)
+
+		# in-process: no interpreter startup, but also no timeout or rlimits
+		output = io.StringIO()
+		with self.inProcessLock, contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+			try:
+				module.assemble_file(assembly_file, machine_code_file)
+			except (Exception, SystemExit):
+				traceback.print_exc()
+		return output.getvalue(), self.OK
 
 	def handleErrorGen(self):
 	
-		curDir = os.getcwd()
-		if self.operating_system == 'linux': 
-			tests = self.listFiles("tests/assembly/" + self.ASM_ERROR_DIR) 
-		elif self.operating_system == 'windows':
-			tests = self.listFiles("tests\\assembly\\" + self.ASM_ERROR_DIR) 
-		os.chdir(self.ASM_RUN_DIR)  
-		
-		for test in tests:
+		tests = self.listFiles(os.path.join(self.ASM_TEST_DIR, self.ASM_ERROR_DIR))
+
+		def runTest(test):
+			assembly_file = os.path.join(self.ASM_TEST_DIR, self.ASM_ERROR_DIR, test)
+			# a temp file per test, so parallel runs do not share one
+			machine_code_file = os.path.join(self.ASM_RUN_DIR, "temp_file_" + test)
+			open(machine_code_file, 'w').close()
+			errors, status = self.runAssembler(assembly_file, machine_code_file)
+			os.remove(machine_code_file)
+			if status != self.OK:
+				errors += "[" + status + "]\n"
+			return errors
+
+		for test, errors in zip(tests, self.runParallel(runTest, tests)):
 			self.printSev(self.HIGH, bcolors.OKCYAN + "Running " + test + bcolors.ENDC)
-			python_command = 'python3 Assembler.py'
-			if self.operating_system == 'linux':
-				assembly_file = ' ' + '../automatedTesting/tests/assembly/' + self.ASM_ERROR_DIR + '/' + test
-			elif self.operating_system == 'windows':
-				assembly_file = ' ' + '..\\automatedTesting\\tests\\assembly\\' + self.ASM_ERROR_DIR + '\\' + test
-			
-			# create a temp file
-			if self.operating_system == 'linux':
-				os.system('touch temp_file.txt')
-			elif self.operating_system == 'windows':
-				os.system('cd . > temp_file.txt')	
-
-			machine_code_file = ' ' + 'temp_file.txt'
-			command = python_command + assembly_file + machine_code_file
-			errors = os.popen(command).read()
-			if self.operating_system == 'linux':
-				os.system('rm temp_file.txt')
-			elif self.operating_system == 'windows':
-				os.system('del temp_file.txt')
-
-
 			self.printSev(self.HIGH, errors, end="")
 			self.printSev(self.HIGH, "============================================\n")
 
-		os.chdir(curDir)
-
 	def handleBin(self, genDir, expDir):
 		
 		passCount = 0
 		totalCount = 0
+		limits = {}
 		
-		curDir = os.getcwd()
-		if self.operating_system == 'linux':
-			tests = self.listFiles("tests/assembly/" + genDir)
-		elif self.operating_system == 'windows':
-			tests = self.listFiles("tests\\assembly\\" + genDir)
+		tests = self.listFiles(os.path.join(self.ASM_TEST_DIR, genDir))
 		tests.sort()
-		os.chdir(self.ASM_RUN_DIR)
-		
-		for test in tests:
+		os.makedirs(os.path.join(self.USER_DIR, "user_" + expDir), exist_ok=True)
 
-			python_command = 'python3 Assembler.py'
-			if self.operating_system == 'linux':
-				assembly_file = ' ' + '../automatedTesting/tests/assembly/' + genDir + '/' + test
-				machine_code_file = ' ' + '../automatedTesting/tests/assembly/user_' + expDir + '/' + test
-				os.system('touch' + ' ' + machine_code_file)
-			elif self.operating_system == 'windows':
-				assembly_file = ' ' + '..\\automatedTesting\\tests\\assembly\\' + genDir + '\\' + test
-				machine_code_file = ' ' + '..\\automatedTesting\\tests\\assembly\\user_' + expDir + '\\' + test
-				os.system('cd . >' + machine_code_file)
-			command = python_command + assembly_file + machine_code_file
-			os.system(command)
-			generatedBin = open(machine_code_file.strip(),'r').readlines()
-
-			if self.operating_system == 'linux':
-				exact_machine_code_file = "../automatedTesting/tests/assembly/" + expDir + "/" + test
-			elif self.operating_system == 'windows':
-				exact_machine_code_file = "..\\automatedTesting\\tests\\assembly\\" + expDir + "\\" + test
-			expectedBin = open(exact_machine_code_file,'r').readlines()
-			
+		def runTest(test):
+			assembly_file = os.path.join(self.ASM_TEST_DIR, genDir, test)
+			machine_code_file = os.path.join(self.USER_DIR, "user_" + expDir, test)
+			open(machine_code_file, 'w').close()
+			return self.runAssembler(assembly_file, machine_code_file)
 
-			if self.diff(generatedBin, expectedBin):
-				self.printSev(self.HIGH, bcolors.OKGREEN + "[PASSED]" + bcolors.ENDC + " " + test)
-				passCount += 1
+		keys = {}
+		records = {}
+		for test in tests:
+			keys[test], records[test] = self.cacheLookup(self.ASM_RUN_DIR,
+				os.path.join(self.ASM_TEST_DIR, genDir, test), os.path.join(self.ASM_TEST_DIR, expDir, test))
+		restored = {}
+		for test in tests:
+			if records[test] is not None:
+				restored[test] = self.cacheRestore(keys[test], records[test], os.path.join(self.USER_DIR, "user_" + expDir, test))
+		toRun = [test for test in tests if restored.get(test) is None]
+
+		# run everything first, then check results in sorted order
+		results = dict(zip(toRun, self.runParallel(runTest, toRun)))
+		for test in tests:
+			machine_code_file = os.path.join(self.USER_DIR, "user_" + expDir, test)
+			if restored.get(test) is not None:
+				output, status, passed, self.firstMismatch = restored[test]
+				self.printSev(self.HIGH, output, end="")
 			else:
-				self.printSev(self.HIGH, bcolors.FAIL + "[FAILED]" + bcolors.ENDC + " " + test)
+				output, status = results[test]
+				self.printSev(self.HIGH, output, end="")
+				passed = False
+				self.firstMismatch = None
+				if status == self.OK:
+					generatedBin = self.readLines(machine_code_file)
+					expectedBin = self.loadExpected(os.path.join(self.ASM_TEST_DIR, expDir, test))
+					passed = self.diff(generatedBin, expectedBin)
+				self.cacheStore(keys[test], output, status, passed, machine_code_file)
+
+			self.report(test, status, passed, limits)
+			if passed:
+				passCount += 1
 			totalCount += 1
 
-		os.chdir(curDir)
-		return passCount, totalCount
+		return passCount, totalCount, limits
 	
 	
 	def grade(self):
@@ -122,18 +185,18 @@ class AsmGrader(Grader):
 			self.printSev(self.HIGH, "")
 			
 			self.printSev(self.HIGH, bcolors.OKBLUE + bcolors.BOLD + "Runing simple tests" + bcolors.ENDC)
-			simplePass, simpleTotal = self.handleBin(self.ASM_SIMPLE_DIR, self.BIN_SIMPLE_DIR)
+			simplePass, simpleTotal, simpleLimits = self.handleBin(self.ASM_SIMPLE_DIR, self.BIN_SIMPLE_DIR)
 
 			self.printSev(self.HIGH, bcolors.OKBLUE + bcolors.BOLD + "\nRunning hard tests" + bcolors.ENDC)
-			hardPass, hardTotal = self.handleBin(self.ASM_HARD_DIR, self.BIN_HARD_DIR)
+			hardPass, hardTotal, hardLimits = self.handleBin(self.ASM_HARD_DIR, self.BIN_HARD_DIR)
 			
 			# uncomment to evaluate error tests
 			# self.printSev(self.HIGH, bcolors.OKBLUE + bcolors.BOLD + "Running error tests" + bcolors.ENDC)
 			# self.handleErrorGen()  
 
 			res = [
-					["Simple", simplePass, simpleTotal, self.SIMPLE_MARKS],
-					["Hard", hardPass, hardTotal, self.HARD_MARKS],
+					["Simple", simplePass, simpleTotal, simpleLimits, self.SIMPLE_MARKS],
+					["Hard", hardPass, hardTotal, hardLimits, self.HARD_MARKS],
 				]
 		
 		return res
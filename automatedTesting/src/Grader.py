@@ -1,57 +1,256 @@
 # Parent class for all graders
 from os import listdir
 from os.path import isfile, join
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
 from colors import bcolors
+import os
+import signal
+import subprocess
+import tempfile
+
+try:
+	import resource
+except ImportError:
+	# no rlimits on Windows, only the wall-clock timeout applies there
+	resource = None
 
 class Grader:
 	## ---- either 'linux' or 'windows'
 	operating_system = 'linux'
 	verbose = False
 	enable = False
+	# number of tests run at the same time
+	jobs = 1
+	# batch mode: suppress all per-test printing
+	quiet = False
+	# path -> normalized lines of an expected output, shared by all graders
+	expectedCache = {}
+	# bump when a change to the graders can change a verdict, to invalidate cached results
+	GRADER_VERSION = "1"
+	# ResultCache, or None to always run every test
+	cache = None
+	# (line number, column, fields in the line) of the first difference found by the last diff
+	firstMismatch = None
 	
+	# Limits for one run of a student program
+	TIMEOUT = 60		# wall-clock seconds, also used as the CPU-time limit
+	MEM_LIMIT_MB = 1024	# address space
+	OUTPUT_LIMIT_MB = 64	# per file written, console output included
+	OUTPUT_SHOWN = 1 << 16	# bytes of console output kept for printing
+
+	# Run status of a test
+	OK = "OK"
+	TIMEOUT_STATUS = "TIMEOUT"
+	OOM_STATUS = "OOM"
+	OUTPUT_LIMIT_STATUS = "OUTPUT LIMIT"
+
 	# Printing severity
 	HIGH = 1 	# Printed even if not verbose
 	LOW = 0
 
 	def printSev(self, sev, string, end = "\n"):
+		if self.quiet:
+			return
 		if sev == self.HIGH or self.verbose:
 			print(string, end=end)
 
 	def listFiles(self, dirPath):
 		return [f for f in listdir(dirPath) if isfile(join(dirPath, f))]
 
+	def runParallel(self, func, items):
+		# Each test runs in its own child process, so threads are enough to
+		# keep self.jobs of them busy. Results come back in the order of items.
+		if self.jobs <= 1:
+			return [func(item) for item in items]
+		with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+			return list(pool.map(func, items))
 
-	def diff(self, lines1, lines2):
-		lines1Clean = []
-		lines2Clean = []
 
-		for l in lines1:
-			if l.strip() != "":
-				lines1Clean.append(l.strip())
+	# Sets the rlimits, then execs the student program in the same process.
+	# Used instead of preexec_fn, which is not safe once the grader runs tests on threads.
+	# The shell starts far faster than a second Python; the soft CPU limit goes
+	# first and the hard one above it, so the CPU limit sends SIGXCPU rather than SIGKILL.
+	# ulimit -v counts KiB and -f counts 512-byte blocks.
+	LIMIT_LAUNCHER = 'ulimit -St "$1"; ulimit -Ht "$(($1 + 1))"; ulimit -v "$2"; ulimit -f "$3"; shift 3; exec "$@"'
 
-		for l in lines2:
-			if l.strip() != "":
-				lines2Clean.append(l.strip())
+	def limitedArgs(self, args):
+		# args wrapped in the launcher above, or unchanged where rlimits do not exist
+		if resource is None:
+			return args
+		cpu = int(self.TIMEOUT) + 1
+		return ["/bin/sh", "-c", self.LIMIT_LAUNCHER, "sh", str(cpu),
+			str(self.MEM_LIMIT_MB << 10), str((self.OUTPUT_LIMIT_MB << 20) // 512)] + list(args)
 
-		match = True
+	def killedBy(self, returncode, name):
+		# signals missing on this platform (e.g. SIGXCPU on Windows) never match
+		sig = getattr(signal, name, None)
+		return sig is not None and returncode == -sig
+
+	def runProgram(self, args, cwd):
+		# Runs one student program under the limits above.
+		# Returns (console output, status).
+		with tempfile.TemporaryFile() as out:
+			try:
+				proc = subprocess.run(self.limitedArgs(args), cwd=cwd, stdout=out, stderr=subprocess.STDOUT,
+					timeout=self.TIMEOUT)
+				returncode = proc.returncode
+			except subprocess.TimeoutExpired:
+				returncode = None
+			except OSError as e:
+				# e.g. a submission without the expected folder
+				return str(e) + "\n", self.OK
+			outputSize = out.tell()
+			out.seek(0)
+			output = out.read(self.OUTPUT_SHOWN).decode(errors="replace")
+
+		if returncode is None or self.killedBy(returncode, "SIGXCPU"):
+			return output, self.TIMEOUT_STATUS
+		if returncode != 0 and ("MemoryError" in output or self.killedBy(returncode, "SIGKILL")):
+			return output, self.OOM_STATUS
+		if outputSize >= self.OUTPUT_LIMIT_MB << 20 or (returncode != 0 and "File too large" in output):
+			return output, self.OUTPUT_LIMIT_STATUS
+		return output, self.OK
+
+	def report(self, test, status, passed, limits):
+		# prints the verdict of one test; limit failures are counted by status
+		if status != self.OK:
+			limits[status] = limits.get(status, 0) + 1
+			self.printSev(self.HIGH, bcolors.WARNING + "[" + status + "]" + bcolors.ENDC + " " + test)
+		elif passed:
+			self.printSev(self.HIGH, bcolors.OKGREEN + "[PASSED]" + bcolors.ENDC + " " + test)
+		else:
+			where = ""
+			if self.firstMismatch is not None:
+				where = " (first mismatch at " + self.describeMismatch(*self.firstMismatch) + ")"
+			self.printSev(self.HIGH, bcolors.FAIL + "[FAILED]" + bcolors.ENDC + " " + test + where)
+
+	def sourceDigest(self, runDir):
+		# hash of the submission's python sources, computed once per folder
+		if not hasattr(self, "sourceDigests"):
+			self.sourceDigests = {}
+		if runDir not in self.sourceDigests:
+			parts = []
+			if os.path.isdir(runDir):
+				for name in sorted(os.listdir(runDir)):
+					if name.endswith(".py"):
+						with open(os.path.join(runDir, name), 'rb') as f:
+							parts += [name.encode(), f.read()]
+			self.sourceDigests[runDir] = self.cache.key(*parts).encode()
+		return self.sourceDigests[runDir]
+
+	def cacheLookup(self, runDir, inputFile, expectedFile):
+		# returns (key, cached record), both None when caching is off
+		if self.cache is None:
+			return None, None
+		with open(inputFile, 'rb') as f:
+			testInput = f.read()
+		try:
+			with open(expectedFile, 'rb') as f:
+				expected = f.read()
+		except FileNotFoundError:
+			expected = b""
+		# a limit verdict only holds for the limits it was reached under
+		limits = "%s %s %s" % (self.TIMEOUT, self.MEM_LIMIT_MB, self.OUTPUT_LIMIT_MB)
+		key = self.cache.key(self.GRADER_VERSION.encode(), limits.encode(), self.sourceDigest(runDir), testInput, expected)
+		return key, self.cache.get(key)
 
-		# Match Size
-		if(len(lines1Clean) > len(lines2Clean)):
-			lines2Clean += [""] * (len(lines1Clean) - len(lines2Clean))
-		elif(len(lines2Clean) > len(lines1Clean)):
-			lines1Clean += [""] * (len(lines2Clean) - len(lines1Clean))
+	def cacheStore(self, key, output, status, passed, generatedFile):
+		# a timeout also depends on how busy the machine was, so it is never cached
+		if key is None or status == self.TIMEOUT_STATUS:
+			return
+		# the generated output is copied next to the record, not read into memory
+		self.cache.put(key, {
+			"output": output,
+			"status": status,
+			"passed": passed,
+			"mismatch": self.firstMismatch,
+		}, generatedFile)
+
+	def cacheRestore(self, key, record, generatedFile):
+		# puts the cached output file back in place, returns (output, status, passed, mismatch),
+		# or None when the output file has been evicted since the lookup and the test has to run again
+		if record["hasOutput"]:
+			try:
+				self.cache.restoreOutput(key, generatedFile)
+			except FileNotFoundError:
+				return None
+		mismatch = tuple(record["mismatch"]) if record["mismatch"] else None
+		return record["output"], record["status"], record["passed"], mismatch
+
+	def readLines(self, path):
+		# a missing output file counts as empty, so one broken run cannot stop the grader
+		try:
+			with open(path, 'r') as f:
+				return f.readlines()
+		except FileNotFoundError:
+			return []
+
+	def streamLines(self, path):
+		# like readLines, but yields one line at a time
+		try:
+			with open(path, 'r') as f:
+				yield from f
+		except FileNotFoundError:
+			return
+
+	def clean(self, lines):
+		return [l.strip() for l in lines if l.strip() != ""]
+
+	def nonBlank(self, lines):
+		for l in lines:
+			l = l.strip()
+			if l != "":
+				yield l
+
+	def loadExpected(self, path):
+		# expected outputs are read and normalized once per process
+		if path not in self.expectedCache:
+			self.expectedCache[path] = self.clean(self.readLines(path))
+		return self.expectedCache[path]
+
+	def describeMismatch(self, lineNum, column, width):
+		# trace rows are the PC followed by x0..x31
+		where = "line " + str(lineNum) + ", column " + str(column + 1)
+		if width == 33 and column == 0:
+			where += " (PC)"
+		elif width == 33:
+			where += " (x" + str(column - 1) + ")"
+		return where
+
+	def diff(self, lines1, lines2):
+		# Compares two line iterables (lists or open files) lazily, ignoring
+		# blank lines and surrounding whitespace. Stops at the first mismatch
+		# unless verbose, so memory use does not depend on the file length.
+		self.firstMismatch = None
+		match = True
 
-		for lineNum, lines in enumerate(zip(lines1Clean, lines2Clean), 1):
+		for lineNum, lines in enumerate(zip_longest(self.nonBlank(lines1), self.nonBlank(lines2), fillvalue=""), 1):
 			if(lines[0] != lines[1]):
-				self.printSev(self.LOW, bcolors.FAIL + "Mismatch at line " + str(lineNum) +  "." + bcolors.ENDC)
-				match &= False
+				words1 = lines[0].split()
+				words2 = lines[1].split()
+				column = 0
+				while column < min(len(words1), len(words2)) and words1[column] == words2[column]:
+					column += 1
+				width = max(len(words1), len(words2))
+				if match:
+					self.firstMismatch = (lineNum, column, width)
+				self.printSev(self.LOW, bcolors.FAIL + "Mismatch at " + self.describeMismatch(lineNum, column, width) +  "." + bcolors.ENDC)
+				match = False
+				if not self.verbose:
+					break
 
 		return match
 
-	def __init__(self, verb, enable,operating_system):
+	def __init__(self, verb, enable,operating_system, jobs=1, quiet=False, timeout=None, cache=None):
+		if timeout is not None:
+			self.TIMEOUT = timeout
+		self.cache = cache
 		self.verbose = verb
 		self.enable = enable
 		self.operating_system = operating_system
+		self.jobs = jobs
+		self.quiet = quiet
 	
 	def grade(self):
 		raise NotImplementedError("Please Implement this method")
\ No newline at end of file
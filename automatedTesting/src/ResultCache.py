@@ -0,0 +1,116 @@
+# On-disk cache of grading results
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+class ResultCache:
+	# Each entry is <key>.json, the result record, and optionally <key>.out,
+	# a copy of the output file the run produced.
+
+	# total size kept on disk before the least recently used entries go
+	MAX_BYTES = 256 << 20
+	# bytes copied at a time when an output file goes in or out of the cache
+	COPY_CHUNK = 1 << 20
+
+	def __init__(self, cacheDir, maxBytes=None):
+		self.cacheDir = os.path.abspath(cacheDir)
+		if maxBytes is not None:
+			self.MAX_BYTES = maxBytes
+		os.makedirs(self.cacheDir, exist_ok=True)
+		self.lock = threading.Lock()
+		self.size = sum(self.entrySize(path) for path in self.entries())
+
+	def entries(self):
+		return [os.path.join(self.cacheDir, f) for f in os.listdir(self.cacheDir) if f.endswith(".json")]
+
+	def outputPath(self, recordPath):
+		return recordPath[:-len(".json")] + ".out"
+
+	def entrySize(self, recordPath):
+		# record plus its output file; 0 for parts that are missing
+		size = 0
+		for path in (recordPath, self.outputPath(recordPath)):
+			try:
+				size += os.path.getsize(path)
+			except OSError:
+				pass
+		return size
+
+	def key(self, *parts):
+		# parts are bytes; the length prefix keeps ("ab", "c") and ("a", "bc") apart
+		h = hashlib.sha256()
+		for part in parts:
+			h.update(len(part).to_bytes(8, "little"))
+			h.update(part)
+		return h.hexdigest()
+
+	def get(self, key):
+		path = os.path.join(self.cacheDir, key + ".json")
+		try:
+			with open(path, 'r') as f:
+				record = json.load(f)
+			# mtime is the LRU clock
+			os.utime(path)
+		except (OSError, ValueError):
+			return None
+		if record.get("hasOutput") and not os.path.exists(self.outputPath(path)):
+			return None
+		return record
+
+	def restoreOutput(self, key, outputFile):
+		# copies the output file stored with key back to outputFile
+		with open(self.outputPath(os.path.join(self.cacheDir, key + ".json")), 'rb') as src:
+			with open(outputFile, 'wb') as dst:
+				shutil.copyfileobj(src, dst, self.COPY_CHUNK)
+
+	def put(self, key, record, outputFile=None):
+		# stores record, plus a copy of outputFile when it is given and exists
+		path = os.path.join(self.cacheDir, key + ".json")
+		tmpSuffix = "." + str(threading.get_ident()) + ".tmp"
+		outPath = self.outputPath(path)
+		size = 0
+		record = dict(record, hasOutput=False)
+		if outputFile is not None:
+			try:
+				with open(outputFile, 'rb') as src:
+					with open(outPath + tmpSuffix, 'wb') as dst:
+						shutil.copyfileobj(src, dst, self.COPY_CHUNK)
+						size = dst.tell()
+				record["hasOutput"] = True
+			except FileNotFoundError:
+				pass
+		data = json.dumps(record)
+		size += len(data)
+		if size > self.MAX_BYTES:
+			if record["hasOutput"]:
+				os.remove(outPath + tmpSuffix)
+			return
+		with open(path + tmpSuffix, 'w') as f:
+			f.write(data)
+		with self.lock:
+			self.size -= self.entrySize(path)
+			if record["hasOutput"]:
+				os.replace(outPath + tmpSuffix, outPath)
+			elif os.path.exists(outPath):
+				os.remove(outPath)
+			os.replace(path + tmpSuffix, path)
+			self.size += size
+			if self.size > self.MAX_BYTES:
+				self.evict()
+
+	def evict(self):
+		# drop least recently used entries until the cache is at 3/4 of its budget
+		entries = sorted(self.entries(), key=os.path.getmtime)
+		for path in entries:
+			if self.size <= self.MAX_BYTES * 3 // 4:
+				break
+			try:
+				self.size -= self.entrySize(path)
+				os.remove(path)
+				if os.path.exists(self.outputPath(path)):
+					os.remove(self.outputPath(path))
+			except OSError:
+				pass
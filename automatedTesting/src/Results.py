@@ -9,19 +9,29 @@ class Results:
 	simRes = None
 
 
+	def marks(self, res):
+		# (marks gained, marks available) over all suites of one grader
+		totalMarksGained = 0
+		totalMarks = 0
+		if res:
+			for suite in res:
+				totalMarksGained += suite[1] * suite[-1]
+				totalMarks += suite[2] * suite[-1]
+		return totalMarksGained, totalMarks
+
 	def declareARes(self, res):
 		print(bcolors.HEADER, end="")
 		
-		totalMarksGained = 0
-		totalMarks = 0
 		for suite in res:
 			print(suite[0], end=": ")
 			print("Marks =", suite[1] * suite[-1], "out of", suite[2] * suite[-1])
 			if(self.VERBOSE):
 				print("Passed", suite[1], "out of", suite[2], "tests")
+			# tests stopped by a resource limit (TIMEOUT, OOM, ...) are reported apart
+			for status, count in sorted(suite[3].items()):
+				print("  " + status + ":", count, "test(s)")
 
-			totalMarksGained += suite[1] * suite[-1]
-			totalMarks += suite[2] * suite[-1]
+		totalMarksGained, totalMarks = self.marks(res)
 
 		print(bcolors.BOLD + bcolors.OKGREEN + "Total: " + str(totalMarksGained) + " out of " + str(totalMarks))
 		print(bcolors.ENDC, end="")
@@ -35,6 +45,25 @@ class Results:
 			print("Simulator ===>")
 			self.declareARes(self.simRes)
 
+	def declareBatch(self, batchRes):
+		# one row per submission: (name, asmRes, simRes)
+		# a suite row is [name, passed, total, {limit status: count}, marks per test]
+		print("\n============== BATCH RESULTS =================\n")
+		nameWidth = max([len("Submission")] + [len(row[0]) for row in batchRes])
+		print(bcolors.HEADER + "Submission".ljust(nameWidth), "Assembler".rjust(12), "Simulator".rjust(12), "Total".rjust(12), " Limits" + bcolors.ENDC)
+		for name, asmRes, simRes in batchRes:
+			asmGained, asmTotal = self.marks(asmRes)
+			simGained, simTotal = self.marks(simRes)
+			limits = {}
+			for suite in (asmRes or []) + (simRes or []):
+				for status, count in suite[3].items():
+					limits[status] = limits.get(status, 0) + count
+			print(name.ljust(nameWidth),
+				f"{asmGained:.2f}/{asmTotal:.2f}".rjust(12),
+				f"{simGained:.2f}/{simTotal:.2f}".rjust(12),
+				f"{asmGained + simGained:.2f}/{asmTotal + simTotal:.2f}".rjust(12),
+				" " + ", ".join(status + " x" + str(count) for status, count in sorted(limits.items())))
+
 	def __init__(self, verb, asmRes, simRes):
 		self.VERBOSE = verb
 		self.asmRes = asmRes
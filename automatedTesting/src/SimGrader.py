@@ -19,59 +19,72 @@ class SimGrader(Grader):
 	TRACE_SIMPLE_DIR = "simple"
 
 
-	def __init__(self, verb, enable,operating_system):
-		super().__init__(verb, enable,operating_system)
+	def __init__(self, verb, enable,operating_system, jobs=1, quiet=False, submission=None, timeout=None, cache=None):
+		super().__init__(verb, enable,operating_system, jobs, quiet, timeout, cache)
 		self.enable = enable
 		self.operating_system = operating_system
 		
-		if self.operating_system == 'linux':
-			self.SIM_RUN_DIR = "../SimpleSimulator/"
-		elif self.operating_system == 'windows':
-			self.SIM_RUN_DIR = "..\\SimpleSimulator\\"
+		# absolute paths, so tests never need to chdir
+		self.SIM_TEST_DIR = os.path.abspath("tests")
+		if submission is None:
+			self.SIM_RUN_DIR = os.path.abspath(os.path.join("..", "SimpleSimulator"))
+			self.USER_DIR = self.SIM_TEST_DIR
+		else:
+			# batch mode: each submission keeps its generated files to itself
+			self.SIM_RUN_DIR = os.path.abspath(os.path.join(submission, "SimpleSimulator"))
+			self.USER_DIR = os.path.abspath(os.path.join(submission, "grader_output"))
 
 	def handleBin(self, genDir, expDir):
 		
 		passCount = 0
 		totalCount = 0
+		limits = {}
 		
-		curDir = os.getcwd()
-		if self.operating_system == 'linux':
-			tests = self.listFiles("tests/bin/" + genDir)
-		elif self.operating_system == 'windows':
-			tests = self.listFiles("tests\\bin\\" + genDir)
+		tests = self.listFiles(os.path.join(self.SIM_TEST_DIR, "bin", genDir))
 		tests.sort()
-		os.chdir(self.SIM_RUN_DIR)
-		
+		os.makedirs(os.path.join(self.USER_DIR, "user_traces", genDir), exist_ok=True)
+
+		def runTest(test):
+			machine_code_file = os.path.join(self.SIM_TEST_DIR, "bin", genDir, test)
+			output_trace_file = os.path.join(self.USER_DIR, "user_traces", genDir, test)
+			return self.runProgram(['python3', 'Simulator.py', machine_code_file, output_trace_file], self.SIM_RUN_DIR)
+
+		keys = {}
+		records = {}
 		for test in tests:
-			
-			python_command = 'python3 Simulator.py'
-			if self.operating_system == 'linux':
-				machine_code_file = ' ' + '../automatedTesting/tests/bin/' + genDir + '/' + test
-				output_trace_file = ' ' + '../automatedTesting/tests/user_traces/' + genDir + '/' + test
-			elif self.operating_system == 'windows':
-				machine_code_file = ' ' + '..\\automatedTesting\\tests\\bin\\' + genDir + '\\' + test
-				output_trace_file = ' ' + '..\\automatedTesting\\tests\\user_traces\\' + genDir + '\\' + test
-			command = python_command + machine_code_file + output_trace_file
-			os.system(command)
-			
-			
-			generatedTrace = open(output_trace_file.strip(),'r').readlines()
+			keys[test], records[test] = self.cacheLookup(self.SIM_RUN_DIR,
+				os.path.join(self.SIM_TEST_DIR, "bin", genDir, test), os.path.join(self.SIM_TEST_DIR, "traces", expDir, test))
+		restored = {}
+		for test in tests:
+			if records[test] is not None:
+				restored[test] = self.cacheRestore(keys[test], records[test], os.path.join(self.USER_DIR, "user_traces", genDir, test))
+		toRun = [test for test in tests if restored.get(test) is None]
 
-			if self.operating_system == 'linux':
-				exact_trace_file = "../automatedTesting/tests/traces/" + expDir + "/" + test
-			elif self.operating_system == 'windows':
-				exact_trace_file = "..\\automatedTesting\\tests\\traces\\" + expDir + "\\" + test
-			expectedTrace = open(exact_trace_file,'r').readlines()
+		# run everything first, then check results in sorted order
+		results = dict(zip(toRun, self.runParallel(runTest, toRun)))
+		for test in tests:
+			output_trace_file = os.path.join(self.USER_DIR, "user_traces", genDir, test)
+			if restored.get(test) is not None:
+				output, status, passed, self.firstMismatch = restored[test]
+				self.printSev(self.HIGH, output, end="")
+			else:
+				output, status = results[test]
+				self.printSev(self.HIGH, output, end="")
+				passed = False
+				self.firstMismatch = None
+				if status == self.OK:
+					# traces can be large, so both sides are streamed from disk
+					generatedTrace = self.streamLines(output_trace_file)
+					expectedTrace = self.streamLines(os.path.join(self.SIM_TEST_DIR, "traces", expDir, test))
+					passed = self.diff(generatedTrace, expectedTrace)
+				self.cacheStore(keys[test], output, status, passed, output_trace_file)
 
-			if self.diff(generatedTrace, expectedTrace):
-				self.printSev(self.HIGH, bcolors.OKGREEN + "[PASSED]" + bcolors.ENDC + " " + test)
+			self.report(test, status, passed, limits)
+			if passed:
 				passCount += 1
-			else:
-				self.printSev(self.HIGH, bcolors.FAIL + "[FAILED]" + bcolors.ENDC + " " + test)
 			totalCount += 1
 
-		os.chdir(curDir)
-		return passCount, totalCount
+		return passCount, totalCount, limits
 	
 	def grade(self):
 		res = None
@@ -82,14 +95,14 @@ class SimGrader(Grader):
 			self.printSev(self.HIGH, "")
 			
 			self.printSev(self.HIGH, bcolors.OKBLUE + bcolors.BOLD + "Runing simple tests" + bcolors.ENDC)
-			simplePass, simpleTotal = self.handleBin(self.BIN_SIMPLE_DIR, self.TRACE_SIMPLE_DIR)
+			simplePass, simpleTotal, simpleLimits = self.handleBin(self.BIN_SIMPLE_DIR, self.TRACE_SIMPLE_DIR)
 
 			self.printSev(self.HIGH, bcolors.OKBLUE + bcolors.BOLD + "\nRunning hard tests" + bcolors.ENDC)
-			hardPass, hardTotal = self.handleBin(self.BIN_HARD_DIR, self.TRACE_HARD_DIR)
+			hardPass, hardTotal, hardLimits = self.handleBin(self.BIN_HARD_DIR, self.TRACE_HARD_DIR)
 			
 			res = [
-					["Simple", simplePass, simpleTotal, self.SIMPLE_MARKS],
-					["Hard", hardPass, hardTotal, self.HARD_MARKS],
+					["Simple", simplePass, simpleTotal, simpleLimits, self.SIMPLE_MARKS],
+					["Hard", hardPass, hardTotal, hardLimits, self.HARD_MARKS],
 				]
 		
 		return res
\ No newline at end of file
@@ -1,15 +1,24 @@
 # Runs automated tests for assembler and simulator
 
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from colors import bcolors
 from AsmGrader import AsmGrader
 from SimGrader import SimGrader
 from Results import Results
+from ResultCache import ResultCache
 
 
 VERBOSE = False
 GRADE_ASSEMBLER = True
 GRADE_SIMULATOR = True
+JOBS = 1
+TIMEOUT = None
+USE_CACHE = True
+IN_PROCESS = False
+CACHE_DIR = ".grader_cache"
+BATCH_DIR = None
 
 def printHelp():
 	print('----Please enter in correct format----')
@@ -18,6 +27,11 @@ def printHelp():
 	print("--no-sim to not grade simulator")
 	print("--linux for Linux operating system")
 	print("--windows for windows operating system")
+	print("--jobs N to run N tests at the same time")
+	print("--batch DIR to grade every submission folder inside DIR")
+	print("--timeout SEC to stop a test after SEC seconds (default 60)")
+	print("--no-cache to rerun every test instead of reusing cached results")
+	print("--in-process to call the assembler's assemble_file() instead of starting python3 per test (no timeout, not with --batch)")
 	print("Example_linux: $python3 src/main.py --linux --no-sim")
 	print("Example_windows: >python3 src\main.py --windows --no-sim")
 
@@ -26,12 +40,18 @@ def setupArgs():
 	global GRADE_ASSEMBLER
 	global GRADE_SIMULATOR
 	global OPERATING_SYSTEM
+	global JOBS
+	global BATCH_DIR
+	global TIMEOUT
+	global USE_CACHE
+	global IN_PROCESS
 
 	if len(sys.argv) < 3:
 		printHelp()
 		exit()
 
-	for arg in sys.argv[1:]:
+	args = iter(sys.argv[1:])
+	for arg in args:
 		if arg == "--verbose":
 			VERBOSE = True
 		elif arg == "--no-asm":
@@ -40,16 +60,74 @@ def setupArgs():
 			GRADE_SIMULATOR = False
 		elif ((arg == "--linux") | (arg == "--windows")):
 			OPERATING_SYSTEM = arg[2:]
+		elif arg == "--jobs":
+			try:
+				JOBS = int(next(args))
+			except (StopIteration, ValueError):
+				printHelp()
+				exit()
+		elif arg == "--no-cache":
+			USE_CACHE = False
+		elif arg == "--in-process":
+			IN_PROCESS = True
+		elif arg == "--timeout":
+			try:
+				TIMEOUT = float(next(args))
+			except (StopIteration, ValueError):
+				printHelp()
+				exit()
+		elif arg == "--batch":
+			BATCH_DIR = next(args, None)
+			if BATCH_DIR is None or not os.path.isdir(BATCH_DIR):
+				printHelp()
+				exit()
 		else:
 			printHelp()
 			exit()
 			# break
 
+	# in-process runs have no timeout and take turns on one lock, so a single
+	# hanging submission would stop every other one in the batch
+	if IN_PROCESS and BATCH_DIR is not None:
+		print("--in-process cannot be used with --batch")
+		exit()
+
+def openCache():
+	if USE_CACHE:
+		return ResultCache(CACHE_DIR)
+	return None
+
+def gradeSubmission(submission, cache):
+	# each submission is graded quietly with its tests run one after another;
+	# the parallelism is across submissions
+	asmGrader = AsmGrader(VERBOSE, GRADE_ASSEMBLER,OPERATING_SYSTEM, quiet=True, submission=submission, timeout=TIMEOUT, cache=cache, inProcess=IN_PROCESS)
+	simGrader = SimGrader(VERBOSE, GRADE_SIMULATOR,OPERATING_SYSTEM, quiet=True, submission=submission, timeout=TIMEOUT, cache=cache)
+	return os.path.basename(submission), asmGrader.grade(), simGrader.grade()
+
+def gradeBatch():
+	# every folder in BATCH_DIR is one submission with its own
+	# SimpleAssembler/Assembler.py and SimpleSimulator/Simulator.py
+	submissions = sorted(
+		os.path.join(BATCH_DIR, d) for d in os.listdir(BATCH_DIR)
+		if os.path.isdir(os.path.join(BATCH_DIR, d))
+	)
+	with ThreadPoolExecutor(max_workers=JOBS) as pool:
+		cache = openCache()
+		batchRes = list(pool.map(lambda submission: gradeSubmission(submission, cache), submissions))
+
+	res = Results(VERBOSE, None, None)
+	res.declareBatch(batchRes)
+
 def main():
 	setupArgs()
 
-	asmGrader = AsmGrader(VERBOSE, GRADE_ASSEMBLER,OPERATING_SYSTEM)
-	simGrader = SimGrader(VERBOSE, GRADE_SIMULATOR,OPERATING_SYSTEM)
+	if BATCH_DIR is not None:
+		gradeBatch()
+		return
+
+	cache = openCache()
+	asmGrader = AsmGrader(VERBOSE, GRADE_ASSEMBLER,OPERATING_SYSTEM, JOBS, timeout=TIMEOUT, cache=cache, inProcess=IN_PROCESS)
+	simGrader = SimGrader(VERBOSE, GRADE_SIMULATOR,OPERATING_SYSTEM, JOBS, timeout=TIMEOUT, cache=cache)
 
 	asmRes = asmGrader.grade()
 	simRes = simGrader.grade()	
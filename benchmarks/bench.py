@@ -0,0 +1,152 @@
+"""
+Benchmarks the assembler and the simulator on the synthetic workloads.
+
+    python3 benchmarks/bench.py [--scale N] [--output FILE] [--only WORKLOAD]
+
+Each tool runs as its own process, exactly as the grader starts it, so the
+times include interpreter start-up. Reported per run:
+  simulator: instructions/sec, trace bytes/sec, peak RSS
+  assembler: source lines/sec, peak RSS
+Results are printed and saved as JSON (by default under benchmarks/results/)
+so runs can be compared over time.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from workloads import WORKLOADS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMULATOR = os.path.join(ROOT, "Simulator.py")
+ASSEMBLER = os.path.join(ROOT, "SimpleAssembler", "simpleassembler.py")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+DEFAULT_SCALE = 20
+# lines of the memory dump at the end of every text trace
+DUMP_LINES = 32
+
+
+def run_measured(args):
+    """Runs args and returns (seconds, peak RSS in KiB or None)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        peak_rss = usage.ru_maxrss
+        if sys.platform == "darwin":
+            peak_rss //= 1024  # bytes there, KiB on Linux
+    else:
+        proc.wait()
+        seconds = time.perf_counter() - start
+        peak_rss = None
+    error = proc.stderr.read().decode(errors="replace")
+    proc.stderr.close()
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{error}")
+    return seconds, peak_rss
+
+
+def count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f)
+
+
+def bench_simulator(name, program, workdir, options):
+    code = os.path.join(workdir, name + ".txt")
+    with open(code, 'w') as f:
+        f.write("".join(format(word, '032b') + "\n" for word in program.machine_code()))
+    trace = os.path.join(workdir, name + "_trace.txt")
+    seconds, peak_rss = run_measured(["python3", SIMULATOR, code, trace] + options)
+    trace_bytes = os.path.getsize(trace) + os.path.getsize(trace.replace(".txt", "_r.txt"))
+    instructions = count_lines(trace) - DUMP_LINES
+    return {
+        "tool": "simulator",
+        "workload": name,
+        "mode": " ".join(options) or "interpreted",
+        "seconds": round(seconds, 4),
+        "instructions": instructions,
+        "instructions_per_sec": round(instructions / seconds),
+        "trace_bytes": trace_bytes,
+        "trace_bytes_per_sec": round(trace_bytes / seconds),
+        "peak_rss_kb": peak_rss,
+    }
+
+
+def bench_assembler(name, program, workdir):
+    source = os.path.join(workdir, name + ".s")
+    lines = program.assembly()
+    with open(source, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    seconds, peak_rss = run_measured(["python3", ASSEMBLER, source, os.path.join(workdir, name + "_asm.txt")])
+    return {
+        "tool": "assembler",
+        "workload": name,
+        "mode": "text",
+        "seconds": round(seconds, 4),
+        "lines": len(lines),
+        "lines_per_sec": round(len(lines) / seconds),
+        "peak_rss_kb": peak_rss,
+    }
+
+
+def print_results(results):
+    for r in results:
+        if r["tool"] == "simulator":
+            print(f"simulator {r['workload']:<9} {r['mode']:<12} {r['instructions']:>10} instr "
+                  f"{r['instructions_per_sec']:>10} instr/s {r['trace_bytes_per_sec'] / 1e6:>8.1f} MB/s trace "
+                  f"{r['peak_rss_kb']} KiB")
+        else:
+            print(f"assembler {r['workload']:<9} {r['mode']:<12} {r['lines']:>10} lines "
+                  f"{r['lines_per_sec']:>10} lines/s {'':>19} {r['peak_rss_kb']} KiB")
+
+
+def main():
+    args = iter(sys.argv[1:])
+    scale = DEFAULT_SCALE
+    output = None
+    only = None
+    for arg in args:
+        if arg == "--scale":
+            scale = int(next(args))
+        elif arg == "--output":
+            output = next(args)
+        elif arg == "--only":
+            only = next(args)
+        else:
+            print(__doc__)
+            sys.exit(1)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, make in WORKLOADS.items():
+            if only is not None and name != only:
+                continue
+            program = make(scale)
+            results.append(bench_assembler(name, program, workdir))
+            for options in ([], ["--blocks"]):
+                results.append(bench_simulator(name, program, workdir, options))
+    print_results(results)
+
+    report = {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("saved", output)
+
+
+if __name__ == "__main__":
+    main()
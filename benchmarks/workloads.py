@@ -0,0 +1,196 @@
+"""
+Synthetic workloads for benchmarking the assembler and the simulator.
+
+Every workload is built from the instructions in ISA.py and can be written
+both as assembly source for the assembler and as machine code for the
+simulator. Branch and jump targets are labels; they are resolved to numeric
+offsets, so the assembly never depends on how the assembler treats labels.
+"""
+import os
+import sys
+
+# ISA.py lives in the repository root, one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ISA
+
+# ABI register names, as the assembler expects them
+REGISTERS = [
+    "zero", "ra", "sp", "gp", "tp", "t0", "t1", "t2", "s0", "s1",
+    "a0", "a1", "a2", "a3", "a4", "a5", "a6", "a7", "s2", "s3",
+    "s4", "s5", "s6", "s7", "s8", "s9", "s10", "s11", "t3", "t4",
+    "t5", "t6",
+]
+register_index = {name: i for i, name in enumerate(REGISTERS)}
+
+# operand names in assembly order, per format; lw differs from the other I-types
+OPERANDS = {
+    "R": ("rd", "rs1", "rs2"),
+    "I": ("rd", "rs1", "imm"),
+    "lw": ("rd", "imm", "rs1"),
+    "S": ("rs2", "imm", "rs1"),
+    "B": ("rs1", "rs2", "imm"),
+    "J": ("rd", "imm"),
+}
+
+# largest count a single addi can load
+MAX_COUNT = 2047
+
+HALT = ("beq", "zero", "zero", 0)
+
+
+class Program:
+    """
+    A list of instructions under construction. Instructions are tuples of
+    the mnemonic and its operands in assembly order, except that lw/sw are
+    (mnemonic, data register, offset, base register). A branch or jal target
+    may be a label name.
+    """
+
+    def __init__(self):
+        self.instructions = []
+        self.labels = {}
+
+    def label(self, name):
+        self.labels[name] = 4*len(self.instructions)
+
+    def emit(self, *instruction):
+        self.instructions.append(instruction)
+
+    def resolved(self):
+        """Returns the instructions with every label target replaced by its offset."""
+        resolved = []
+        for i, inst in enumerate(self.instructions):
+            target = inst[-1]
+            if ISA.INSTRUCTIONS[inst[0]][0] in ("B", "J"):
+                if isinstance(target, str):
+                    target = self.labels[target] - 4*i
+                inst = inst[:-1] + (target,)
+            resolved.append(inst)
+        return resolved
+
+    def assembly(self):
+        """Returns the program as assembler source lines."""
+        lines = []
+        for inst in self.resolved():
+            name = inst[0]
+            if name in ("lw", "sw"):
+                lines.append(f"{name} {inst[1]},{inst[2]}({inst[3]})")
+            else:
+                lines.append(f"{name} " + ",".join(str(operand) for operand in inst[1:]))
+        return lines
+
+    def machine_code(self):
+        """Returns the program as 32-bit instruction words for the simulator."""
+        return [encode(inst) for inst in self.resolved()]
+
+
+def encode(inst):
+    name = inst[0]
+    if name not in ISA.INSTRUCTIONS:
+        raise ValueError(f"Unsupported instruction: {name}")
+    fmt, opcode, funct3, funct7 = ISA.INSTRUCTIONS[name]
+    operands = dict(zip(OPERANDS.get(name, OPERANDS[fmt]), inst[1:]))
+    imm = operands.pop("imm", 0)
+    bits = ISA.FORMATS[fmt]["imm_bits"]
+    if bits and not -(1 << (bits - 1)) <= imm < 1 << (bits - 1):
+        raise ValueError(f"Immediate out of range for {name}: {imm}")
+    registers = {field: register_index[register] for field, register in operands.items()}
+    return ISA.encode_fields(fmt, imm, opcode=opcode, funct3=funct3, funct7=funct7, **registers)
+
+
+def counted_loop(scale):
+    """Nested counted loops around a block of ALU instructions, ~8000 steps per scale."""
+    p = Program()
+    p.emit("addi", "t1", "zero", 1000)
+    p.emit("addi", "s1", "zero", min(scale, MAX_COUNT))
+    p.label("outer")
+    p.emit("addi", "t0", "zero", 0)
+    p.label("inner")
+    p.emit("addi", "t0", "t0", 1)
+    p.emit("add", "a0", "a0", "t0")
+    p.emit("sub", "a1", "a1", "t0")
+    p.emit("slt", "a2", "a1", "a0")
+    p.emit("srl", "a3", "a0", "a2")
+    p.emit("or", "a4", "a3", "a1")
+    p.emit("and", "a5", "a4", "a0")
+    p.emit("bne", "t0", "t1", "inner")
+    p.emit("addi", "s1", "s1", -1)
+    p.emit("bne", "s1", "zero", "outer")
+    p.emit(*HALT)
+    return p
+
+
+def memory_sweep(scale):
+    """lw/sw sweeps over the 32-word data segment at 0x10000, ~6000 steps per scale."""
+    p = Program()
+    p.emit("addi", "t2", "zero", 1)
+    for _ in range(16):
+        p.emit("add", "t2", "t2", "t2")  # t2 = 0x10000
+    p.emit("addi", "s0", "zero", min(scale, MAX_COUNT))
+    p.label("outer")
+    p.emit("addi", "s1", "zero", 30)
+    p.label("pass")
+    p.emit("addi", "t0", "t2", 0)
+    p.emit("addi", "t1", "zero", 32)
+    p.label("word")
+    p.emit("lw", "a0", 0, "t0")
+    p.emit("addi", "a0", "a0", 1)
+    p.emit("sw", "a0", 0, "t0")
+    p.emit("addi", "t0", "t0", 4)
+    p.emit("addi", "t1", "t1", -1)
+    p.emit("bne", "t1", "zero", "word")
+    p.emit("addi", "s1", "s1", -1)
+    p.emit("bne", "s1", "zero", "pass")
+    p.emit("addi", "s0", "s0", -1)
+    p.emit("bne", "s0", "zero", "outer")
+    p.emit(*HALT)
+    return p
+
+
+def jump_heavy(scale):
+    """Calls, returns and unconditional jumps in a counted loop, ~7000 steps per scale."""
+    p = Program()
+    p.emit("addi", "s0", "zero", min(scale, MAX_COUNT))
+    p.label("outer")
+    p.emit("addi", "s1", "zero", 1000)
+    p.label("loop")
+    p.emit("jal", "ra", "first")
+    p.emit("addi", "s1", "s1", -1)
+    p.emit("bne", "s1", "zero", "loop")
+    p.emit("addi", "s0", "s0", -1)
+    p.emit("beq", "s0", "zero", "done")
+    p.emit("beq", "zero", "zero", "outer")
+    p.label("first")
+    p.emit("addi", "a0", "a0", 1)
+    p.emit("jal", "zero", "second")
+    p.label("second")
+    p.emit("addi", "a1", "a1", 2)
+    p.emit("jalr", "zero", "ra", 0)
+    p.label("done")
+    p.emit(*HALT)
+    return p
+
+
+def straight_line(scale):
+    """1000 lines of mixed straight-line code per scale, mainly for the assembler."""
+    p = Program()
+    p.emit("addi", "t2", "zero", 1)
+    for _ in range(16):
+        p.emit("add", "t2", "t2", "t2")
+    body = [
+        ("addi", "a0", "a0", 3), ("add", "a1", "a1", "a0"), ("sub", "a2", "a1", "a0"),
+        ("slt", "a3", "a2", "a1"), ("srl", "a4", "a1", "a3"), ("or", "a5", "a4", "a2"),
+        ("and", "a6", "a5", "a1"), ("sw", "a6", 8, "t2"), ("lw", "a7", 8, "t2"), ("addi", "t3", "t3", -1),
+    ]
+    for i in range(100*scale):
+        p.emit(*body[i % len(body)])
+    p.emit(*HALT)
+    return p
+
+
+WORKLOADS = {
+    "loop": counted_loop,
+    "memory": memory_sweep,
+    "jumps": jump_heavy,
+    "straight": straight_line,
+}